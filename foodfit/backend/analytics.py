@@ -0,0 +1,148 @@
+"""
+Order analytics for FoodFit dashboards.
+save_order and save_preferences update rollup tables in the same
+transaction (per-minute, hour and day buckets plus dish counts per day, see
+models.record_rollups), so reading stats costs O(buckets) per shard instead
+of scanning and decoding orders. Rollups of existing data are rebuilt with:
+
+    python analytics.py backfill
+"""
+
+import argparse
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, Iterable, Optional
+
+import models
+
+# Window shown when no start is given
+DEFAULT_WINDOWS = {
+    "minute": timedelta(hours=1),
+    "hour": timedelta(days=1),
+    "day": timedelta(days=30),
+}
+DEFAULT_TOP_DISHES = 10
+
+
+def _bucket(value: datetime, granularity: str) -> str:
+    return value.strftime(models.STATS_GRANULARITIES[granularity])
+
+
+def _parse_time(value: str, end: bool = False) -> datetime:
+    """
+    YYYY-MM-DD or YYYY-MM-DD HH:MM (UTC unless an offset is given); raises
+    ValueError. A date-only end covers that whole day, like the inclusive
+    `to` of the listings.
+    """
+    value = value.strip()
+    try:
+        day = date.fromisoformat(value)
+    except ValueError:
+        moment = datetime.fromisoformat(value)
+        if moment.tzinfo is not None:
+            # Rollup buckets are naive UTC
+            moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+        return moment
+    return datetime.combine(day, time.max if end else time.min)
+
+
+def query_stats(
+    granularity: str = "hour",
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    top: int = DEFAULT_TOP_DISHES,
+) -> Dict[str, Any]:
+    """
+    Orders, average total_calories, new preferences and how many of those
+    plans were ordered from (whenever the first order came) per bucket
+    between since and until (inclusive, UTC), with totals and the top
+    dishes of the covered days. Raises KeyError for an unknown granularity
+    and ValueError for unparsable times.
+    """
+    if granularity not in models.STATS_GRANULARITIES:
+        raise KeyError(granularity)
+    end = _parse_time(until, end=True) if until else datetime.now(timezone.utc)
+    start = _parse_time(since) if since else end - DEFAULT_WINDOWS[granularity]
+    first, last = _bucket(start, granularity), _bucket(end, granularity)
+
+    buckets: Dict[str, Dict[str, int]] = {}
+    for row in models.fan_out("""
+        SELECT bucket, orders, order_calories, preferences, converted
+        FROM stats_buckets
+        WHERE granularity = ? AND bucket BETWEEN ? AND ?
+    """, (granularity, first, last)):
+        counts = buckets.setdefault(
+            row["bucket"], {"orders": 0, "order_calories": 0, "preferences": 0, "converted": 0}
+        )
+        for column in counts:
+            counts[column] += row[column]
+
+    dishes: Dict[str, int] = {}
+    for row in models.fan_out("""
+        SELECT name, SUM(count) AS count FROM stats_dishes
+        WHERE day BETWEEN ? AND ? GROUP BY name
+    """, (first[:10], last[:10])):
+        dishes[row["name"]] = dishes.get(row["name"], 0) + row["count"]
+
+    def summary(counts: Dict[str, int]) -> Dict[str, Any]:
+        orders = counts["orders"]
+        return {
+            "orders": orders,
+            "avg_total_calories": round(counts["order_calories"] / orders, 1) if orders else None,
+            "preferences": counts["preferences"],
+            "converted": counts["converted"],
+        }
+
+    totals = {
+        column: sum(counts[column] for counts in buckets.values())
+        for column in ("orders", "order_calories", "preferences", "converted")
+    }
+    return {
+        "granularity": granularity,
+        "from": first,
+        "to": last,
+        "buckets": [{"bucket": bucket, **summary(buckets[bucket])} for bucket in sorted(buckets)],
+        "totals": {
+            **summary(totals),
+            # Share of the plans created in the range that got at least one order
+            "conversion_rate": (
+                round(totals["converted"] / totals["preferences"], 3) if totals["preferences"] else None
+            ),
+        },
+        "top_dishes": [
+            {"name": name, "count": count}
+            for name, count in sorted(dishes.items(), key=lambda item: (-item[1], item[0]))[:top]
+        ],
+    }
+
+
+def backfill(shards: Optional[Iterable[int]] = None) -> Dict[str, int]:
+    """
+    Rebuild the rollups of the given shards (default: all) from their
+    orders and preferences tables. Rows already moved to archive.py
+    databases are not counted.
+    """
+    totals = {"orders": 0, "preferences": 0}
+    for shard in models.shard_ids() if shards is None else shards:
+        conn = models.get_connection(shard)
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("DELETE FROM stats_buckets")
+        cursor.execute("DELETE FROM stats_dishes")
+        for table in totals:
+            models.record_rollups(cursor, table, "1")
+            totals[table] += cursor.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        conn.commit()
+        conn.close()
+    return totals
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="FoodFit analytics rollups.")
+    parser.add_argument("command", choices=("backfill",))
+    parser.parse_args()
+    for table, count in backfill().items():
+        print(f"{table}: {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,231 +3,40 @@ Flask application for FoodFit API.
 Provides endpoints for preferences, snacks, and orders.
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
-from typing import Dict, List, Any, Iterable
+from array import array
+from concurrent.futures import Executor
+from functools import wraps
+from itertools import islice
+from typing import Callable, Dict, List, Any, Iterable, NamedTuple, Optional, Tuple
+import base64
+import heapq
+import json
+import os
 import re
+import analytics
+import archive
+import catalog
+import export
+import idempotency
 import models
+import nutrition
+import profiler
+import shared_catalog
+import singleflight
+import static_assets
+from catalog import Meal
+from nutrition import calculate_target_macros, score_menu_deviation
 
 app = Flask(__name__)
 CORS(app)  # Allow cross-origin requests from frontend
+static_assets.register(app)  # Serve ../frontend with caching and compression
 
-# Meal library with sample meals (БЖВ: білки, жири, вуглеводи в грамах)
-MEAL_LIBRARY = {
-    "breakfast": [
-        {
-            "name": "Вівсянка з ягодами",
-            "calories": 350,
-            "proteins": 12,
-            "fats": 8,
-            "carbs": 58,
-            "ingredients": ["вівсянка", "ягоди", "мед"],
-            "tags": ["веган", "швидко"],
-        },
-        {
-            "name": "Омлет зі шпинатом",
-            "calories": 320,
-            "proteins": 22,
-            "fats": 20,
-            "carbs": 8,
-            "ingredients": ["яйця", "шпинат", "сир"],
-            "tags": ["білок", "швидко"],
-        },
-        {
-            "name": "Чіа пудинг з манго",
-            "calories": 280,
-            "proteins": 10,
-            "fats": 15,
-            "carbs": 32,
-            "ingredients": ["чіа", "кокосове молоко", "манго"],
-            "tags": ["веган", "без глютену"],
-        },
-        {
-            "name": "Грецький йогурт з горіхами",
-            "calories": 380,
-            "proteins": 20,
-            "fats": 18,
-            "carbs": 32,
-            "ingredients": ["грецький йогурт", "горіхи", "мед"],
-            "tags": ["білок", "швидко"],
-        },
-        {
-            "name": "Тост з авокадо та яйцем",
-            "calories": 340,
-            "proteins": 16,
-            "fats": 22,
-            "carbs": 28,
-            "ingredients": ["хліб цільнозерновий", "авокадо", "яйце"],
-            "tags": ["білок", "корисні жири"],
-        },
-        {
-            "name": "Сирники з ягодами",
-            "calories": 360,
-            "proteins": 18,
-            "fats": 12,
-            "carbs": 42,
-            "ingredients": ["сир", "борошно", "ягоди"],
-            "tags": ["білок", "молочні"],
-        },
-        {
-            "name": "Смузі боул",
-            "calories": 300,
-            "proteins": 8,
-            "fats": 10,
-            "carbs": 48,
-            "ingredients": ["банани", "шпинат", "ягоди", "чіа"],
-            "tags": ["веган", "швидко"],
-        },
-    ],
-    "lunch": [
-        {
-            "name": "Лосось із кіноа",
-            "calories": 520,
-            "proteins": 35,
-            "fats": 18,
-            "carbs": 52,
-            "ingredients": ["лосось", "кіноа", "овочі"],
-            "tags": ["білок", "омега-3"],
-        },
-        {
-            "name": "Курка з булгуром",
-            "calories": 480,
-            "proteins": 38,
-            "fats": 12,
-            "carbs": 48,
-            "ingredients": ["курка", "булгур", "овочі"],
-            "tags": ["білок", "швидко"],
-        },
-        {
-            "name": "Тофу боул",
-            "calories": 450,
-            "proteins": 22,
-            "fats": 15,
-            "carbs": 58,
-            "ingredients": ["тофу", "рис", "овочі", "соєвий соус"],
-            "tags": ["веган", "білок"],
-        },
-        {
-            "name": "Індичка з бататом та брокколі",
-            "calories": 460,
-            "proteins": 40,
-            "fats": 10,
-            "carbs": 42,
-            "ingredients": ["індичка", "батат", "брокколі"],
-            "tags": ["білок", "низькі вуглеводи"],
-        },
-        {
-            "name": "Вегетаріанський бургер",
-            "calories": 440,
-            "proteins": 18,
-            "fats": 16,
-            "carbs": 56,
-            "ingredients": ["котлета з бобів", "булочка", "овочі"],
-            "tags": ["веган", "швидко"],
-        },
-        {
-            "name": "Грецький салат з куркою",
-            "calories": 420,
-            "proteins": 32,
-            "fats": 20,
-            "carbs": 28,
-            "ingredients": ["курка", "помидори", "огірки", "фета", "оливкова олія"],
-            "tags": ["білок", "свіжість"],
-        },
-        {
-            "name": "Паста з морепродуктами",
-            "calories": 500,
-            "proteins": 28,
-            "fats": 14,
-            "carbs": 62,
-            "ingredients": ["паста", "креветки", "помідори", "часник"],
-            "tags": ["білок", "морепродукти"],
-        },
-        {
-            "name": "Рататуй з рибною котлетою",
-            "calories": 470,
-            "proteins": 30,
-            "fats": 16,
-            "carbs": 46,
-            "ingredients": ["риба", "баклажани", "кабачки", "помідори"],
-            "tags": ["білок", "овочі"],
-        },
-    ],
-    "dinner": [
-        {
-            "name": "Місо суп з локшиною",
-            "calories": 380,
-            "proteins": 16,
-            "fats": 8,
-            "carbs": 58,
-            "ingredients": ["місо", "локшина", "водорості", "тофу"],
-            "tags": ["веган", "легко"],
-        },
-        {
-            "name": "Запечені овочі",
-            "calories": 320,
-            "proteins": 8,
-            "fats": 12,
-            "carbs": 48,
-            "ingredients": ["батат", "брокколі", "перець", "оливкова олія"],
-            "tags": ["веган", "без глютену"],
-        },
-        {
-            "name": "Індичка з бататом",
-            "calories": 420,
-            "proteins": 36,
-            "fats": 10,
-            "carbs": 38,
-            "ingredients": ["індичка", "батат", "брокколі"],
-            "tags": ["білок", "низькі вуглеводи"],
-        },
-        {
-            "name": "Овочева запіканка з сиром",
-            "calories": 350,
-            "proteins": 20,
-            "fats": 18,
-            "carbs": 28,
-            "ingredients": ["кабачки", "помідори", "сир", "яйця"],
-            "tags": ["білок", "легко"],
-        },
-        {
-            "name": "Рибний суп",
-            "calories": 340,
-            "proteins": 28,
-            "fats": 10,
-            "carbs": 32,
-            "ingredients": ["риба", "овочі", "рис"],
-            "tags": ["білок", "легко"],
-        },
-        {
-            "name": "Салат з тунцем",
-            "calories": 360,
-            "proteins": 32,
-            "fats": 14,
-            "carbs": 24,
-            "ingredients": ["тунець", "листя салату", "овочі", "оливкова олія"],
-            "tags": ["білок", "легко"],
-        },
-        {
-            "name": "Грибна юшка з крупяною кашею",
-            "calories": 330,
-            "proteins": 12,
-            "fats": 8,
-            "carbs": 52,
-            "ingredients": ["гриби", "крупа", "овочі"],
-            "tags": ["веган", "легко"],
-        },
-        {
-            "name": "Курячий салат з авокадо",
-            "calories": 380,
-            "proteins": 30,
-            "fats": 20,
-            "carbs": 18,
-            "ingredients": ["курка", "авокадо", "листя салату", "овочі"],
-            "tags": ["білок", "низькі вуглеводи"],
-        },
-    ],
-}
+
+# Meals are read from the memory-mapped catalog (shared_catalog.current()),
+# addressed by id; Meal tuples are only built for the dishes that are served
+MEAL_TYPES = catalog.MEAL_TYPES
 
 
 def try_parse_int(value: Any, default: int = 0) -> int:
@@ -256,38 +65,31 @@ def normalize_terms(value: Any) -> List[str]:
     return cleaned
 
 
-def meal_matches_preferences(
-    meal: Dict[str, Any],
-    dislikes: Iterable[str],
-    allergies: Iterable[str],
-) -> bool:
+def encode_terms(terms: Iterable[str]) -> Tuple[bytes, ...]:
+    """UTF-8 form of keywords, for matching against catalog haystacks."""
+    return tuple(term.encode("utf-8") for term in terms)
+
+
+def meal_matches_preferences(haystack: bytes, stop_terms: Iterable[bytes]) -> bool:
     """
     Check whether a meal avoids all disliked items and allergens.
-    We perform a simple substring check across the ingredient names.
+    We perform a simple substring check across the name and ingredient
+    names (the meal's haystack from the shared catalog).
     """
-    combined_stop_list = list(dislikes) + list(allergies)
-
-    if not combined_stop_list:
-        return True
-
-    haystack = [meal["name"].lower()] + [ing.lower() for ing in meal["ingredients"]]
-    for banned in combined_stop_list:
-        if any(banned in field for field in haystack):
+    for banned in stop_terms:
+        if banned in haystack:
             return False
     return True
 
 
-def score_meal_for_likes(meal: Dict[str, Any], likes: Iterable[str]) -> int:
+def score_meal_for_likes(haystack: bytes, likes: Iterable[bytes]) -> int:
     """
     Simple scoring that counts how many liked terms appear in the meal's
     ingredients or name. Higher score means the meal is more preferable.
     """
-    if not likes:
-        return 0
-    haystack = [meal["name"].lower()] + [ing.lower() for ing in meal["ingredients"]]
     score = 0
     for liked in likes:
-        if any(liked in field for field in haystack):
+        if liked in haystack:
             score += 1
     return score
 
@@ -297,28 +99,27 @@ def pick_meal(
     likes: Iterable[str],
     dislikes: Iterable[str],
     allergies: Iterable[str],
-) -> Dict[str, Any]:
+) -> Meal:
     """
     Choose the most suitable meal for a given meal_type (breakfast, lunch, dinner)
     while respecting dislikes and allergens.
     """
-    options = MEAL_LIBRARY.get(meal_type, [])
+    store = shared_catalog.current()
+    options = store.ids(meal_type)
     if not options:
         raise ValueError(f"No meal options configured for '{meal_type}'")
 
+    stop_terms = encode_terms([*dislikes, *allergies])
     safe_options = [
-        meal for meal in options if meal_matches_preferences(meal, dislikes, allergies)
+        meal_id for meal_id in options
+        if meal_matches_preferences(store.haystack(meal_id), stop_terms)
     ]
     if not safe_options:
-        safe_options = options  # fall back to something rather than failing
+        safe_options = list(options)  # fall back to something rather than failing
 
-    decorated: List[tuple] = [
-        (score_meal_for_likes(meal, likes), meal) for meal in safe_options
-    ]
-
-    decorated.sort(key=lambda item: item[0], reverse=True)
-    best_meal = decorated[0][1]
-    return best_meal
+    liked = encode_terms(likes)
+    best_id = max(safe_options, key=lambda meal_id: score_meal_for_likes(store.haystack(meal_id), liked))
+    return store.meal(best_id)
 
 
 def get_used_meals_from_history(history: List[Dict[str, Any]], days_to_check: int = 7) -> Dict[str, set]:
@@ -334,8 +135,8 @@ def get_used_meals_from_history(history: List[Dict[str, Any]], days_to_check: in
     for day_data in recent_days:
         menu = day_data.get("menu", {})
         for meal_type in ["breakfast", "lunch", "dinner"]:
-            if meal_type in menu and "name" in menu[meal_type]:
-                used_meals[meal_type].add(menu[meal_type]["name"])
+            if meal_type in menu:
+                used_meals[meal_type].add(menu[meal_type].name)
     
     return used_meals
 
@@ -352,12 +153,12 @@ def get_used_day_menus_from_history(history: List[Dict[str, Any]], days_to_check
     
     for day_data in recent_days:
         menu = day_data.get("menu", {})
-        breakfast_name = menu.get("breakfast", {}).get("name", "")
-        lunch_name = menu.get("lunch", {}).get("name", "")
-        dinner_name = menu.get("dinner", {}).get("name", "")
-        
-        if breakfast_name and lunch_name and dinner_name:
-            day_menu_tuple = (breakfast_name, lunch_name, dinner_name)
+        if all(meal_type in menu for meal_type in ("breakfast", "lunch", "dinner")):
+            day_menu_tuple = (
+                menu["breakfast"].name,
+                menu["lunch"].name,
+                menu["dinner"].name,
+            )
             used_day_menus.add(day_menu_tuple)
     
     return used_day_menus
@@ -370,38 +171,48 @@ def pick_meal_with_history(
     allergies: Iterable[str],
     used_meals: set,
     max_attempts: int = 50,
-) -> Dict[str, Any]:
+) -> Meal:
     """
     Choose a meal that hasn't been used recently.
     Falls back to any safe meal if all have been used.
     """
-    options = MEAL_LIBRARY.get(meal_type, [])
-    if not options:
+    store = shared_catalog.current()
+    if not store.ids(meal_type):
         raise ValueError(f"No meal options configured for '{meal_type}'")
 
-    safe_options = [
-        meal for meal in options 
-        if meal_matches_preferences(meal, dislikes, allergies)
-    ]
-    if not safe_options:
-        safe_options = options
+    ranked = ranked_slot_options(
+        store, meal_type, tuple(sorted({*dislikes, *allergies})), tuple(likes)
+    )
+    # Best liked meal that was not used recently; if all were used, allow repeats
+    for meal_id in ranked:
+        if store.name(meal_id) not in used_meals:
+            return store.meal(meal_id)
+    return store.meal(ranked[0])
 
-    # Filter out recently used meals
-    available_options = [
-        meal for meal in safe_options 
-        if meal["name"] not in used_meals
-    ]
-    
-    # If all meals were used, allow repeats but prefer less recent ones
-    if not available_options:
-        available_options = safe_options
 
-    # Score and pick best
-    decorated: List[tuple] = [
-        (score_meal_for_likes(meal, likes), meal) for meal in available_options
-    ]
-    decorated.sort(key=lambda item: item[0], reverse=True)
-    return decorated[0][1]
+# Per-profile selections of meal ids, bounded by the ids they hold in total
+slot_cache = shared_catalog.IdCache()
+
+
+@slot_cache
+def ranked_slot_options(
+    store: shared_catalog.MappedCatalog,
+    meal_type: str,
+    stop_terms: Tuple[str, ...],
+    likes: Tuple[str, ...],
+) -> array:
+    """
+    Ids of the safe meals of a type (all meals if none is safe), most liked
+    first and otherwise in catalog order. Cached per profile, so generation
+    does not rescan the catalog for every attempt and day.
+    """
+    safe_options = safe_slot_options(store, meal_type, stop_terms) or store.ids(meal_type)
+    liked = encode_terms(likes)
+    return array("I", sorted(
+        safe_options,
+        key=lambda meal_id: score_meal_for_likes(store.haystack(meal_id), liked),
+        reverse=True,
+    ))
 
 
 def calculate_macros(menu: Dict[str, Any]) -> Dict[str, int]:
@@ -413,9 +224,9 @@ def calculate_macros(menu: Dict[str, Any]) -> Dict[str, int]:
     for meal_type in ["breakfast", "lunch", "dinner"]:
         if meal_type in menu:
             meal = menu[meal_type]
-            total_proteins += meal.get("proteins", 0)
-            total_fats += meal.get("fats", 0)
-            total_carbs += meal.get("carbs", 0)
+            total_proteins += meal.proteins
+            total_fats += meal.fats
+            total_carbs += meal.carbs
     
     return {
         "proteins": total_proteins,
@@ -424,43 +235,26 @@ def calculate_macros(menu: Dict[str, Any]) -> Dict[str, int]:
     }
 
 
-def calculate_target_macros(target_calories: int) -> Dict[str, float]:
-    """
-    Calculate target БЖВ based on standard ratios:
-    - Proteins: 30% of calories (4 cal/g)
-    - Fats: 30% of calories (9 cal/g)
-    - Carbs: 40% of calories (4 cal/g)
-    """
-    target_proteins = (target_calories * 0.30) / 4
-    target_fats = (target_calories * 0.30) / 9
-    target_carbs = (target_calories * 0.40) / 4
-    
-    return {
-        "proteins": round(target_proteins),
-        "fats": round(target_fats),
-        "carbs": round(target_carbs),
-    }
-
-
 def generate_menu(
     likes: Iterable[str],
     dislikes: Iterable[str],
     allergies: Iterable[str],
     target_calories: int,
     history: List[Dict[str, Any]] = None,
+    macro_ratios: Dict[str, float] = None,
 ) -> Dict[str, Any]:
     """
     Build a menu dictionary for breakfast, lunch and dinner.
     Avoids repeating full day menus from last 7 days.
     Also avoids repeating individual meals from last 7 days when possible.
-    Tries to match target calories and БЖВ.
+    Tries to match target calories and БЖВ (optionally with custom macro ratios).
     """
     if history is None:
         history = []
     
     used_meals = get_used_meals_from_history(history, days_to_check=7)
     used_day_menus = get_used_day_menus_from_history(history, days_to_check=7)
-    target_macros = calculate_target_macros(target_calories)
+    target_macros = calculate_target_macros(target_calories, macro_ratios)
     
     menu = {}
     best_score = float('inf')
@@ -477,9 +271,9 @@ def generate_menu(
             current_menu[meal_type] = choice
         
         # Check if this exact day menu combination was used recently
-        breakfast_name = current_menu["breakfast"]["name"]
-        lunch_name = current_menu["lunch"]["name"]
-        dinner_name = current_menu["dinner"]["name"]
+        breakfast_name = current_menu["breakfast"].name
+        lunch_name = current_menu["lunch"].name
+        dinner_name = current_menu["dinner"].name
         day_menu_tuple = (breakfast_name, lunch_name, dinner_name)
         
         if day_menu_tuple in used_day_menus:
@@ -487,16 +281,10 @@ def generate_menu(
             continue
         
         macros = calculate_macros(current_menu)
-        total_calories = sum(meal["calories"] for meal in current_menu.values())
-        
-        # Calculate deviation score (lower is better)
-        calorie_diff = abs(total_calories - target_calories)
-        protein_diff = abs(macros["proteins"] - target_macros["proteins"])
-        fat_diff = abs(macros["fats"] - target_macros["fats"])
-        carb_diff = abs(macros["carbs"] - target_macros["carbs"])
-        
-        # Weighted score (calories most important)
-        score = calorie_diff * 2 + protein_diff + fat_diff + carb_diff
+        total_calories = sum(meal.calories for meal in current_menu.values())
+        score = score_menu_deviation(
+            total_calories, macros, target_calories, target_macros
+        )
         
         if score < best_score:
             best_score = score
@@ -518,7 +306,7 @@ def generate_menu(
             menu[meal_type] = choice
         
         macros = calculate_macros(menu)
-        total_calories = sum(meal["calories"] for meal in menu.values())
+        total_calories = sum(meal.calories for meal in menu.values())
         menu["total_calories"] = total_calories
         menu["total_proteins"] = macros["proteins"]
         menu["total_fats"] = macros["fats"]
@@ -528,6 +316,422 @@ def generate_menu(
     return best_menu
 
 
+def generate_plan_days(
+    likes: Iterable[str],
+    dislikes: Iterable[str],
+    allergies: Iterable[str],
+    target_calories: int,
+    first_day: int,
+    last_day: int,
+    history: List[Dict[str, Any]] = None,
+    macro_ratios: Dict[str, float] = None,
+    snacks: List[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Generate menus for days first_day..last_day of a plan.
+    Generation is warm-started from the last 7 days of the given history,
+    so a stored plan can be continued without rebuilding it from day 1.
+    When snacks are given, every day is passed through the portion solver,
+    which may scale dishes and add snacks to close the gap to the targets.
+    """
+    target_macros = calculate_target_macros(target_calories, macro_ratios)
+    current_history = sorted(history or [], key=lambda x: x["day_number"])[-7:]
+    plan_days = []
+
+    for day in range(first_day, last_day + 1):
+        menu_data = generate_menu(
+            likes, dislikes, allergies, target_calories, current_history, macro_ratios
+        )
+
+        menu = {
+            "breakfast": menu_data["breakfast"],
+            "lunch": menu_data["lunch"],
+            "dinner": menu_data["dinner"],
+        }
+        day_data = {
+            "day": day,
+            "menu": menu,
+            "total_calories": menu_data.get("total_calories", 0),
+            "total_proteins": menu_data.get("total_proteins", 0),
+            "total_fats": menu_data.get("total_fats", 0),
+            "total_carbs": menu_data.get("total_carbs", 0),
+        }
+        if snacks is not None:
+            solution = nutrition.solve_day(menu, snacks, target_calories, target_macros)
+            day_data.update(
+                portions=solution["portions"],
+                snacks=solution["snacks"],
+                total_calories=solution["total_calories"],
+                total_proteins=solution["total_proteins"],
+                total_fats=solution["total_fats"],
+                total_carbs=solution["total_carbs"],
+            )
+        plan_days.append(day_data)
+
+        # Add to history for next day generation (to avoid repeats within this plan)
+        current_history.append({
+            "day_number": day,
+            "menu": menu,
+        })
+
+        # Keep only last 7 days in history to avoid memory issues
+        if len(current_history) > 7:
+            current_history = current_history[-7:]
+
+    return plan_days
+
+
+def serialized_plan_days(
+    likes: List[str],
+    dislikes: List[str],
+    allergies: List[str],
+    target_calories: int,
+    first_day: int,
+    last_day: int,
+    history: List[Dict[str, Any]],
+    macro_ratios: Dict[str, float] = None,
+    snacks: List[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """generate_plan_days in JSON form; a module-level function so process pools can run it."""
+    return [
+        serialize_plan_day(day_data)
+        for day_data in generate_plan_days(
+            likes, dislikes, allergies, target_calories,
+            first_day, last_day, history, macro_ratios, snacks,
+        )
+    ]
+
+
+def generate_plan_days_shared(
+    likes: List[str],
+    dislikes: List[str],
+    allergies: List[str],
+    target_calories: int,
+    first_day: int,
+    last_day: int,
+    history: List[Dict[str, Any]],
+    macro_ratios: Dict[str, float] = None,
+    snacks: List[Dict[str, Any]] = None,
+    executor: Optional[Executor] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Serialized generate_plan_days result. Generation is deterministic (meal
+    ranking is, and solve_day has a fixed search budget), so identical
+    concurrent requests (same profile, day range and history window) share
+    a single computation. With an executor the computation runs there while
+    the calling thread holds the flight.
+    """
+    if first_day > last_day:
+        # Nothing to generate, so nothing to coalesce
+        return []
+    key = singleflight.make_key({
+        "likes": likes,
+        "dislikes": dislikes,
+        "allergies": allergies,
+        "calories": target_calories,
+        "days": [first_day, last_day],
+        "history": [
+            [day_data["day_number"], [day_data["menu"][t].name for t in MEAL_TYPES if t in day_data["menu"]]]
+            for day_data in sorted(history, key=lambda x: x["day_number"])[-7:]
+        ],
+        "macro_ratios": macro_ratios,
+        "snacks": [[snack["id"], snack["calories"]] for snack in snacks] if snacks is not None else None,
+    })
+    args = (
+        likes, dislikes, allergies, target_calories,
+        first_day, last_day, history, macro_ratios, snacks,
+    )
+    if executor is None:
+        return singleflight.coalesce(key, lambda: serialized_plan_days(*args))
+    return singleflight.coalesce(key, lambda: executor.submit(serialized_plan_days, *args).result())
+
+
+def load_menu(stored_menu: Dict[str, Any]) -> Dict[str, Meal]:
+    """
+    Turn a stored JSON menu back into Meal objects, reusing the shared
+    catalog instance when the dish is still in the catalog unchanged.
+    """
+    store = shared_catalog.current()
+    menu = {}
+    for meal_type in MEAL_TYPES:
+        data = stored_menu.get(meal_type)
+        if not data:
+            continue
+        name = data.get("name")
+        meal_id = store.find(name) if isinstance(name, str) else None
+        meal = store.meal(meal_id) if meal_id is not None else None
+        if meal is None or meal.calories != data.get("calories"):
+            meal = Meal.from_dict(data)
+        menu[meal_type] = meal
+    return menu
+
+
+def load_history(stored_days: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Convert stored plan days into history entries with Meal menus."""
+    return [
+        {"day_number": day_data["day_number"], "menu": load_menu(day_data["menu"])}
+        for day_data in stored_days
+    ]
+
+
+def serialize_menu(menu: Dict[str, Meal]) -> Dict[str, Any]:
+    """JSON form of a menu of Meal objects."""
+    return {meal_type: meal.to_dict() for meal_type, meal in menu.items()}
+
+
+def serialize_plan_day(day_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    JSON form of a generated plan day. Solved portions and snacks are kept
+    inside the menu so they are stored together with it.
+    """
+    plan_day = {key: value for key, value in day_data.items() if key not in ("portions", "snacks")}
+    plan_day["menu"] = serialize_menu(day_data["menu"])
+    if "portions" in day_data:
+        plan_day["menu"]["portions"] = day_data["portions"]
+        plan_day["menu"]["snacks"] = day_data["snacks"]
+    return plan_day
+
+
+def history_day_to_plan_day(day_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a stored menu_history day into the plan day response shape."""
+    return {
+        "day": day_data["day_number"],
+        "menu": day_data["menu"],
+        "total_calories": day_data["total_calories"] or 0,
+        "total_proteins": day_data["total_proteins"] or 0,
+        "total_fats": day_data["total_fats"] or 0,
+        "total_carbs": day_data["total_carbs"] or 0,
+    }
+
+
+def profile_matches(
+    stored: Dict[str, Any],
+    requested_calories: int,
+    likes: List[str],
+    dislikes: List[str],
+    allergies: List[str],
+    macro_ratios: Optional[Dict[str, float]] = None,
+    optimize_portions: bool = False,
+) -> bool:
+    """Check whether a stored preferences record has the same generation profile."""
+    return (
+        stored["requested_calories"] == requested_calories
+        and stored["likes"] == ", ".join(likes)
+        and stored["dislikes"] == ", ".join(dislikes)
+        and stored["allergies"] == ", ".join(allergies)
+        and (stored["macro_ratios"] or nutrition.DEFAULT_MACRO_RATIOS)
+        == (macro_ratios or nutrition.DEFAULT_MACRO_RATIOS)
+        and stored["optimize_portions"] == optimize_portions
+    )
+
+
+@slot_cache
+def safe_slot_options(
+    store: shared_catalog.MappedCatalog, meal_type: str, stop_terms: Tuple[str, ...]
+) -> array:
+    """Ids of the meals of a given type that avoid all disliked items and allergens."""
+    banned = encode_terms(stop_terms)
+    return array("I", (
+        meal_id for meal_id in store.ids(meal_type)
+        if meal_matches_preferences(store.haystack(meal_id), banned)
+    ))
+
+
+def smallest_alternatives(
+    store: shared_catalog.MappedCatalog, scored: List[Tuple[float, int, float]], k: int
+) -> List[Tuple[float, int, float]]:
+    """
+    The k lowest (score, meal id, portion) entries, ordered by score and
+    then meal name, exactly like the head of a full sort but without sorting.
+    """
+    if k <= 0:
+        return []
+    best = heapq.nsmallest(k, scored)
+    if len(best) == k:
+        # Every pair tied with the k-th score may win the name tie-break
+        cutoff = best[-1][0]
+        best = [item for item in scored if item[0] <= cutoff]
+    best.sort(key=lambda item: (item[0], store.name(item[1])))
+    return best[:k]
+
+
+# Cached selections hold the mapping they were computed from; drop them when
+# catalog_import.py swaps in a new catalog file
+shared_catalog.on_swap(slot_cache.clear)
+
+
+def find_meal_alternatives(
+    plan_days: List[Dict[str, Any]],
+    day_number: int,
+    meal_type: str,
+    target_calories: int,
+    stop_terms: Iterable[str],
+    k: int,
+    macro_ratios: Optional[Dict[str, float]] = None,
+    optimize_portions: bool = False,
+    portions: Optional[Dict[str, float]] = None,
+    snacks: Iterable[Dict[str, Any]] = (),
+) -> List[Tuple[float, Meal, float, bool]]:
+    """
+    Return up to k best replacements for one meal of a stored plan day as
+    (score, meal, portion, recently_used) tuples. Meals used for the same
+    slot within 7 days before or after the day are avoided, so a swap does
+    not create a repeat with either side; they are only offered after all
+    fresh options once the catalog runs out.
+    The other dishes count with their stored portions and the day's snacks
+    are included. With optimize_portions every candidate is scored at its
+    best portion size (with the solver's portion penalty), otherwise at 1.0.
+    """
+    portions = portions or {}
+    snacks = list(snacks)
+    day_menu = next(d["menu"] for d in plan_days if d["day_number"] == day_number)
+    rest = [
+        (day_menu[other], portions.get(other, 1.0))
+        for other in MEAL_TYPES if other != meal_type and other in day_menu
+    ]
+    rest_totals = tuple(
+        sum(round(getattr(meal, field) * portion) for meal, portion in rest)
+        + sum(int(snack.get(field) or 0) for snack in snacks)
+        for field in ("calories", "proteins", "fats", "carbs")
+    )
+    current_name = day_menu[meal_type].name if meal_type in day_menu else None
+    recently_used = {
+        d["menu"][meal_type].name
+        for d in plan_days
+        if 0 < abs(day_number - d["day_number"]) <= 7 and meal_type in d["menu"]
+    }
+
+    store = shared_catalog.current()
+    current_id = store.find(current_name) if current_name is not None else None
+    recent_ids = {store.find(name) for name in recently_used}
+    target_macros = calculate_target_macros(target_calories, macro_ratios)
+    rest_calories, rest_proteins, rest_fats, rest_carbs = rest_totals
+
+    def slot_score(meal_id: int, portion: float) -> float:
+        """generate_menu deviation objective of the day with this dish."""
+        macros = {
+            "proteins": rest_proteins + round(store.proteins[meal_id] * portion),
+            "fats": rest_fats + round(store.fats[meal_id] * portion),
+            "carbs": rest_carbs + round(store.carbs[meal_id] * portion),
+        }
+        return score_menu_deviation(
+            rest_calories + round(store.calories[meal_id] * portion),
+            macros, target_calories, target_macros,
+        )
+
+    # Score the cached safe options of the slot and keep only the best k
+    # fresh and repeated meals
+    fresh: List[Tuple[float, int, float]] = []
+    repeats: List[Tuple[float, int, float]] = []
+    for meal_id in safe_slot_options(store, meal_type, tuple(sorted(set(stop_terms)))):
+        if meal_id == current_id:
+            continue
+        if optimize_portions:
+            score, portion = min(
+                (slot_score(meal_id, step) + nutrition.portion_penalty(step), step)
+                for step in nutrition.PORTION_STEPS
+            )
+        else:
+            score, portion = slot_score(meal_id, 1.0), 1.0
+        (repeats if meal_id in recent_ids else fresh).append((score, meal_id, portion))
+
+    best_fresh = smallest_alternatives(store, fresh, k)
+    best_repeats = smallest_alternatives(store, repeats, k - len(best_fresh))
+    return [(score, store.meal(meal_id), portion, False) for score, meal_id, portion in best_fresh] + [
+        (score, store.meal(meal_id), portion, True) for score, meal_id, portion in best_repeats
+    ]
+
+# ---------------------------------------------------------------------------
+# Operations listings
+# ---------------------------------------------------------------------------
+
+# Listings expose personal data: require this token in X-Admin-Token.
+# Without a token they are closed unless local requests are explicitly
+# allowed; behind a reverse proxy every request looks local
+ADMIN_TOKEN = os.environ.get("FOODFIT_ADMIN_TOKEN", "")
+ADMIN_ALLOW_LOCAL = os.environ.get("FOODFIT_ADMIN_ALLOW_LOCAL", "0") == "1"
+DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def admin_only(view: Callable) -> Callable:
+    """Restrict an operations endpoint to staff."""
+    @wraps(view)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if ADMIN_TOKEN:
+            allowed = request.headers.get("X-Admin-Token") == ADMIN_TOKEN
+        else:
+            allowed = ADMIN_ALLOW_LOCAL and request.remote_addr in ("127.0.0.1", "::1")
+        if not allowed:
+            return jsonify({"error": "Доступ заборонено."}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    """Opaque cursor pointing after a listed row."""
+    raw = json.dumps([row["created_at"], row["id"]]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(token: str) -> Optional[Tuple[str, int]]:
+    """Parse a cursor from encode_cursor; raises ValueError when invalid."""
+    if not token:
+        return None
+    try:
+        created_at, record_id = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    except (ValueError, TypeError) as error:
+        raise ValueError(token) from error
+    if not isinstance(created_at, str) or not isinstance(record_id, int):
+        raise ValueError(token)
+    return created_at, record_id
+
+
+def listing_filters(table: str) -> Dict[str, Any]:
+    """Read listing filters from the query string; raises ValueError on bad dates."""
+    filters = {
+        column: request.args.get(column, "").strip()
+        for column in models.LISTING_FILTERS[table]
+    }
+    for arg, key in (("from", "date_from"), ("to", "date_to")):
+        value = request.args.get(arg, "").strip()
+        if value and not DATE_PATTERN.match(value):
+            raise ValueError(value)
+        filters[key] = value
+    return filters
+
+
+def list_records(table: str, to_record: Callable) -> Any:
+    """Keyset-paginated listing response for orders or preferences."""
+    try:
+        after = decode_cursor(request.args.get("cursor", ""))
+        filters = listing_filters(table)
+    except ValueError:
+        return jsonify({"error": "Некоректний курсор або фільтр дати."}), 400
+    limit = min(max(try_parse_int(request.args.get("limit"), default=50), 1), 500)
+
+    rows = list(islice(models.iter_rows(table, filters, after, chunk_size=limit + 1), limit + 1))
+    records = [to_record(row) for row in rows[:limit]]
+    next_cursor = encode_cursor(records[-1]) if len(rows) > limit else None
+    return jsonify({table: records, "next_cursor": next_cursor})
+
+
+if profiler.ENABLED:
+
+    @app.before_request
+    def start_query_profile() -> None:
+        g.query_profile = profiler.start_request(request.endpoint or request.path)
+
+    @app.after_request
+    def finish_query_profile(response: Response) -> Response:
+        token = g.pop("query_profile", None)
+        profile = profiler.finish_request(token) if token is not None else None
+        if profile is not None:
+            # Statements of streamed bodies run later and are not included
+            response.headers["X-Query-Count"] = str(profile.query_count)
+            response.headers["X-Query-Time-Ms"] = f"{profile.query_time * 1000:.2f}"
+        return response
+
+
 # ---------------------------------------------------------------------------
 # Routes
 # ---------------------------------------------------------------------------
@@ -547,6 +751,7 @@ def snacks_endpoint() -> Any:
 
 
 @app.post("/api/preferences")
+@idempotency.idempotent("preferences")
 def preferences_endpoint() -> Any:
     """
     Accept user preferences, store them, generate menus for all days of the plan and return a JSON
@@ -558,135 +763,296 @@ def preferences_endpoint() -> Any:
         "likes": "лосось, чіа",
         "dislikes": "глютен",
         "allergies": "арахіс",
-        "plan_type": "monthly"
+        "plan_type": "monthly",
+        "macro_ratios": {"proteins": 30, "fats": 25, "carbs": 45},
+        "optimize_portions": true
     }
+    macro_ratios and optimize_portions are optional. With optimize_portions
+    each day's menu also gets "portions" (multiplier per dish) and "snacks"
+    chosen by the nutrition solver, and the day totals include them.
+    Returning users with an unchanged profile get their stored plan patched
+    with the missing days only. Pass "mode": "extend" to continue the plan
+    with another period after the last stored day.
     """
-    payload = request.get_json(force=True, silent=True) or {}
+    body, status = handle_preferences(request.get_json(force=True, silent=True) or {})
+    return jsonify(body), status
+
 
+USER_NAME_REQUIRED_ERROR = "Поле 'ім'я' є обов'язковим."
+
+
+class PlanRequest(NamedTuple):
+    """A POST /api/preferences body with the stored data its plan builds on."""
+    user_name: str
+    requested_calories: int
+    likes: List[str]
+    dislikes: List[str]
+    allergies: List[str]
+    plan_type: Any
+    macro_ratios: Optional[Dict[str, float]]
+    optimize_portions: bool
+    days_count: int
+    extend: bool
+    existing_pref: Optional[Dict[str, Any]]
+    # Days of the stored plan being patched; None when a plan is built from day 1
+    stored_days: Optional[List[Dict[str, Any]]]
+    # Arguments of generate_plan_days_shared
+    generation: Tuple[Any, ...]
+
+
+def handle_preferences(payload: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """Body and status of POST /api/preferences."""
+    plan = read_plan_request(payload)
+    if plan is None:
+        return {"error": USER_NAME_REQUIRED_ERROR}, 400
+    return save_plan(plan, generate_plan_days_shared(*plan.generation))
+
+
+def read_plan_request(payload: Dict[str, Any]) -> Optional[PlanRequest]:
+    """
+    First stage of POST /api/preferences: parse the body and read what the
+    plan builds on. Returns None without a user name. Only reads the
+    database, so the ASGI app runs it on its DB threads.
+    """
     user_name = payload.get("user_name", "").strip()
     if not user_name:
-        return (
-            jsonify({"error": "Поле 'ім'я' є обов'язковим."}),
-            400,
-        )
+        return None
 
     requested_calories = try_parse_int(payload.get("calories"), default=2000)
     likes = normalize_terms(payload.get("likes"))
     dislikes = normalize_terms(payload.get("dislikes"))
     allergies = normalize_terms(payload.get("allergies"))
     plan_type = payload.get("plan_type", "weekly")
+    macro_ratios = nutrition.parse_macro_ratios(payload.get("macro_ratios"))
+    # Portion solver (0.5x-2x per dish plus snacks) is opt-in
+    optimize_portions = bool(payload.get("optimize_portions"))
+    solver_snacks = models.fetch_snacks() if optimize_portions else None
 
     # Determine number of days based on plan type
     days_count = 30 if plan_type == "monthly" else 7
-
-    # Check if this is a new user or existing user
-    conn = models.get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT id FROM preferences 
-        WHERE user_name = ? 
-        ORDER BY created_at DESC 
-        LIMIT 1
-    """, (user_name,))
-    existing_pref = cursor.fetchone()
-    conn.close()
-
-    preference_id = None
-    history = []
-    
-    if existing_pref:
-        preference_id = existing_pref["id"]
-        history = models.get_menu_history(preference_id, days_back=30)
-    
-    # Build history for menu generation (need at least 14 days to avoid repeats)
-    current_history = history.copy()
-    
-    # Generate menus for all days
-    all_days_menus = []
-    
-    for day in range(1, days_count + 1):
-        # Generate menu for this day with history consideration
-        # History includes previous days in this generation + existing history
-        menu_data = generate_menu(
-            likes, dislikes, allergies, requested_calories, current_history
-        )
-        
-        menu = {
-            "breakfast": menu_data["breakfast"],
-            "lunch": menu_data["lunch"],
-            "dinner": menu_data["dinner"],
-        }
-        total_menu_calories = menu_data.get("total_calories", 0)
-        total_proteins = menu_data.get("total_proteins", 0)
-        total_fats = menu_data.get("total_fats", 0)
-        total_carbs = menu_data.get("total_carbs", 0)
-        
-        all_days_menus.append({
-            "day": day,
-            "menu": menu,
-            "total_calories": total_menu_calories,
-            "total_proteins": total_proteins,
-            "total_fats": total_fats,
-            "total_carbs": total_carbs,
-        })
-        
-        # Add to history for next day generation (to avoid repeats within this plan)
-        current_history.append({
-            "day_number": day,
-            "menu": menu,
-        })
-        
-        # Keep only last 7 days in history to avoid memory issues
-        if len(current_history) > 7:
-            current_history = current_history[-7:]
-
-    # Save preferences (creates new or updates)
-    # Save first day's menu as the main menu for compatibility
-    first_day_menu = all_days_menus[0]["menu"]
-    first_day_calories = all_days_menus[0]["total_calories"]
-    
-    record_id = models.save_preferences(
-        user_name=user_name,
-        requested_calories=requested_calories,
-        likes=", ".join(likes),
-        dislikes=", ".join(dislikes),
-        allergies=", ".join(allergies),
-        plan_type=str(plan_type),
-        menu=first_day_menu,
-        total_calories=first_day_calories,
+    # "extend" appends a new period after the last stored day instead of
+    # returning the current plan
+    extend = payload.get("mode") == "extend"
+
+    existing_pref = models.get_latest_preference(user_name)
+
+    if existing_pref and profile_matches(
+        existing_pref, requested_calories, likes, dislikes, allergies,
+        macro_ratios, optimize_portions,
+    ):
+        # Same profile: patch the stored plan and generate only missing days
+        stored_days = models.get_plan_days(existing_pref["id"])
+        first_day = models.get_next_day_number(existing_pref["id"])
+        last_day = first_day + days_count - 1 if extend else days_count
+        history = load_history(stored_days[-7:])
+    else:
+        # New user or changed profile: build the plan from day 1, using the
+        # tail of the previous plan only to avoid repeating recent meals
+        stored_days = None
+        first_day, last_day = 1, days_count
+        history = []
+        if existing_pref:
+            previous_days = models.get_menu_history(existing_pref["id"], days_back=7)
+            if previous_days:
+                newest_day = previous_days[0]["day_number"]
+                history = [
+                    {"day_number": day_data["day_number"] - newest_day, "menu": load_menu(day_data["menu"])}
+                    for day_data in previous_days
+                ]
+
+    return PlanRequest(
+        user_name, requested_calories, likes, dislikes, allergies, plan_type,
+        macro_ratios, optimize_portions, days_count, extend, existing_pref, stored_days,
+        (
+            likes, dislikes, allergies, requested_calories,
+            first_day, last_day, history, macro_ratios, solver_snacks,
+        ),
     )
 
-    # Save all days to history
-    for day_data in all_days_menus:
-        models.save_menu_day(
-            preference_id=record_id,
-            day_number=day_data["day"],
-            menu=day_data["menu"],
-            total_calories=day_data["total_calories"],
-            total_proteins=day_data["total_proteins"],
-            total_fats=day_data["total_fats"],
-            total_carbs=day_data["total_carbs"],
+
+def save_plan(plan: PlanRequest, new_days: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], int]:
+    """
+    Last stage of POST /api/preferences: store the generated days and build
+    the response body and status.
+    """
+    if plan.stored_days is not None:
+        record_id = plan.existing_pref["id"]
+        models.save_menu_days(record_id, new_days)
+        if plan.existing_pref["plan_type"] != str(plan.plan_type):
+            models.update_plan_type(record_id, str(plan.plan_type))
+
+        if plan.extend:
+            all_days_menus = new_days
+        else:
+            all_days_menus = [
+                history_day_to_plan_day(day_data) for day_data in plan.stored_days
+            ][:plan.days_count] + new_days
+    else:
+        all_days_menus = new_days
+        # Save first day's menu as the main menu for compatibility
+        record_id = models.save_preferences(
+            user_name=plan.user_name,
+            requested_calories=plan.requested_calories,
+            likes=", ".join(plan.likes),
+            dislikes=", ".join(plan.dislikes),
+            allergies=", ".join(plan.allergies),
+            plan_type=str(plan.plan_type),
+            menu=all_days_menus[0]["menu"],
+            total_calories=all_days_menus[0]["total_calories"],
+            macro_ratios=plan.macro_ratios,
+            optimize_portions=plan.optimize_portions,
         )
+        # A superseded plan keeps its days: orders and the alternatives
+        # endpoint still refer to it, and archive.py moves it once it ages
+        models.save_menu_days(record_id, all_days_menus)
 
     # Fetch snack suggestions for the user.
     snacks = models.fetch_snacks()
 
     response = {
-        "user_name": user_name,
-        "requested_calories": requested_calories,
-        "plan_type": plan_type,
-        "days_count": days_count,
+        "user_name": plan.user_name,
+        "requested_calories": plan.requested_calories,
+        "plan_type": plan.plan_type,
+        "days_count": len(all_days_menus),
         "days": all_days_menus,
         "snacks": snacks,
         "record_id": record_id,
     }
-    return jsonify(response), 201
+    return response, 201
+
+
+@app.get("/api/plans/<int:record_id>/day/<int:day_number>/alternatives")
+def meal_alternatives_endpoint(record_id: int, day_number: int) -> Any:
+    """
+    Return the k best replacement meals for one slot of a stored plan day.
+    Query parameters: meal (breakfast, lunch, dinner) and k (default 5).
+    """
+    meal_type = request.args.get("meal", "")
+    if meal_type not in MEAL_TYPES:
+        return jsonify({"error": "Невідомий тип прийому їжі."}), 400
+    k = min(max(try_parse_int(request.args.get("k"), default=5), 1), 20)
+
+    preference = archive.find_preference(record_id)
+    if preference is None:
+        return jsonify({"error": "План не знайдено."}), 404
+    stored_days = archive.find_plan_days(record_id)
+    if not any(d["day_number"] == day_number for d in stored_days):
+        return jsonify({"error": "День плану не знайдено."}), 404
+    plan_days = load_history(
+        [d for d in stored_days if abs(d["day_number"] - day_number) <= 7]
+    )
+
+    stop_terms = normalize_terms(preference["dislikes"]) + normalize_terms(preference["allergies"])
+    current = next(d["menu"] for d in stored_days if d["day_number"] == day_number)
+    optimize_portions = preference["optimize_portions"]
+    alternatives = find_meal_alternatives(
+        plan_days, day_number, meal_type,
+        preference["requested_calories"], stop_terms, k,
+        preference["macro_ratios"], optimize_portions,
+        current.get("portions"), current.get("snacks") or (),
+    )
+    return jsonify(
+        {
+            "record_id": record_id,
+            "day": day_number,
+            "meal": meal_type,
+            "current": current.get(meal_type),
+            "alternatives": [
+                dict(
+                    meal.to_dict(), score=score, recently_used=repeat,
+                    # Portion the score assumes, for plans with the portion solver
+                    **({"portion": portion} if optimize_portions else {}),
+                )
+                for score, meal, portion, repeat in alternatives
+            ],
+        }
+    )
+
+
+@app.get("/api/orders")
+@admin_only
+def list_orders_endpoint() -> Any:
+    """
+    List orders newest first. Query parameters: status, from, to
+    (YYYY-MM-DD), limit (default 50) and cursor (next_cursor of the
+    previous page).
+    """
+    return list_records("orders", models.order_from_row)
+
+
+@app.get("/api/preferences")
+@admin_only
+def list_preferences_endpoint() -> Any:
+    """
+    List preferences records newest first. Query parameters: user_name,
+    plan_type, from, to, limit and cursor, as for /api/orders.
+    """
+    return list_records("preferences", models.preference_summary_from_row)
+
+
+@app.get("/api/export/<table>")
+@admin_only
+def export_endpoint(table: str) -> Any:
+    """
+    Stream all matching orders or preferences as CSV (default) or NDJSON
+    (?format=ndjson). Accepts the same filters as the listings.
+    """
+    if table not in models.LISTING_COLUMNS:
+        return jsonify({"error": "Невідома таблиця для експорту."}), 404
+    fmt = request.args.get("format", "csv")
+    if fmt not in export.FORMATS:
+        return jsonify({"error": "Невідомий формат експорту."}), 400
+    try:
+        filters = listing_filters(table)
+    except ValueError:
+        return jsonify({"error": "Некоректний фільтр дати."}), 400
+
+    response = Response(export.stream(table, fmt, filters), content_type=export.FORMATS[fmt])
+    response.headers["Content-Disposition"] = f"attachment; filename={table}.{fmt}"
+    return response
+
+
+@app.get("/api/stats")
+@admin_only
+def stats_endpoint() -> Any:
+    """
+    Dashboard rollups: orders, average total_calories, new plans and
+    conversions per bucket, plus top dishes. Query parameters: granularity
+    (minute, hour or day), from and to (YYYY-MM-DD[ HH:MM], UTC unless an
+    offset is given) and top.
+    """
+    top = min(max(try_parse_int(request.args.get("top"), default=10), 1), 100)
+    try:
+        stats = analytics.query_stats(
+            request.args.get("granularity", "hour"),
+            request.args.get("from") or None,
+            request.args.get("to") or None,
+            top,
+        )
+    except KeyError:
+        return jsonify({"error": "Невідома гранулярність статистики."}), 400
+    except ValueError:
+        return jsonify({"error": "Некоректний фільтр дати."}), 400
+    return jsonify(stats)
+
+
+@app.get("/api/debug/queries")
+@admin_only
+def debug_queries_endpoint() -> Any:
+    """
+    SQL profile of this worker: slowest statement shapes (?top=20), recent
+    slow queries with their query plans and detected N+1 patterns.
+    Collected only when FOODFIT_PROFILE_SQL=1.
+    """
+    top = min(max(try_parse_int(request.args.get("top"), default=20), 1), 200)
+    return jsonify(profiler.snapshot(top))
 
 
 PHONE_PATTERN = re.compile(r"^[+0-9()\-\s]{7,20}$")
 
 
 @app.post("/api/order")
+@idempotency.idempotent("order")
 def order_endpoint() -> Any:
     """
     Save an order for later processing. We perform basic validation before
@@ -702,8 +1068,12 @@ def order_endpoint() -> Any:
         "total_calories": 1800
     }
     """
-    payload = request.get_json(force=True, silent=True) or {}
+    body, status = handle_order(request.get_json(force=True, silent=True) or {})
+    return jsonify(body), status
 
+
+def handle_order(payload: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """Body and status of POST /api/order, shared with the ASGI app."""
     user_name = payload.get("user_name", "").strip()
     phone = payload.get("phone", "").strip()
     address = payload.get("address", "").strip()
@@ -713,13 +1083,13 @@ def order_endpoint() -> Any:
     preference_id = try_parse_int(payload.get("record_id"), default=0)
 
     if not user_name:
-        return jsonify({"error": "Вкажіть ім'я для замовлення."}), 400
+        return {"error": "Вкажіть ім'я для замовлення."}, 400
     if not phone or not PHONE_PATTERN.match(phone):
-        return jsonify({"error": "Невірний формат номера телефону."}), 400
+        return {"error": "Невірний формат номера телефону."}, 400
     if not address:
-        return jsonify({"error": "Адреса доставки є обов'язковою."}), 400
+        return {"error": "Адреса доставки є обов'язковою."}, 400
     if not items:
-        return jsonify({"error": "Список страв порожній."}), 400
+        return {"error": "Список страв порожній."}, 400
 
     simplified_items: List[Dict[str, Any]] = []
     for entry in items:
@@ -730,7 +1100,7 @@ def order_endpoint() -> Any:
                 simplified_items.append({"name": name, "calories": calories})
 
     if not simplified_items:
-        return jsonify({"error": "Не вдалося зчитати перелік страв."}), 400
+        return {"error": "Не вдалося зчитати перелік страв."}, 400
 
     order_id = models.save_order(
         preference_id=preference_id if preference_id > 0 else None,
@@ -741,13 +1111,11 @@ def order_endpoint() -> Any:
         items=simplified_items,
         total_calories=total_calories,
     )
-    return jsonify(
-        {
-            "status": "accepted",
-            "order_id": order_id,
-            "message": "Замовлення прийнято. Ми скоро зателефонуємо для підтвердження!",
-        }
-    ), 201
+    return {
+        "status": "accepted",
+        "order_id": order_id,
+        "message": "Замовлення прийнято. Ми скоро зателефонуємо для підтвердження!",
+    }, 201
 
 
 
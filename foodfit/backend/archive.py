@@ -0,0 +1,296 @@
+"""
+Retention and archival for FoodFit history tables.
+Moves completed plans and delivered orders into monthly archive databases
+so the hot database.db stays small, and reads through to the archives for
+historical lookups.
+
+Run periodically (e.g. from cron):
+
+    python archive.py --older-than 90
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import models
+
+ARCHIVE_DIR = Path(__file__).parent / "archive"
+ARCHIVE_AFTER_DAYS = int(os.environ.get("FOODFIT_ARCHIVE_AFTER_DAYS", "90"))
+
+# Tables moved to the archive, in the order they are copied
+ARCHIVED_TABLES = ("preferences", "menu_history", "orders")
+# Columns that identify an archived row. Preferences and orders IDs are
+# unique across shards, but menu_history IDs come from each shard's own
+# AUTOINCREMENT, so archived days are keyed by plan and day number instead
+ARCHIVE_KEYS = {
+    "preferences": ("id",),
+    "menu_history": ("preference_id", "day_number"),
+    "orders": ("id",),
+}
+# Shard-local columns that are not copied to the archive
+SHARD_LOCAL_COLUMNS = {"menu_history": ("id",)}
+
+
+def archive_path(month: str) -> Path:
+    """Path of the archive database for a month in YYYY-MM format."""
+    return ARCHIVE_DIR / f"foodfit-{month}.db"
+
+
+def list_archives() -> List[Path]:
+    """All archive databases, newest month first."""
+    if not ARCHIVE_DIR.exists():
+        return []
+    return sorted(ARCHIVE_DIR.glob("foodfit-*.db"), reverse=True)
+
+
+def _table_columns(cursor: sqlite3.Cursor, schema: str, table: str) -> List[str]:
+    cursor.execute(f"PRAGMA {schema}.table_info({table})")
+    return [row[1] for row in cursor.fetchall()]
+
+
+def _archived_columns(cursor: sqlite3.Cursor, table: str) -> List[str]:
+    """Columns of a hot table that are copied to the archive."""
+    local = SHARD_LOCAL_COLUMNS.get(table, ())
+    return [column for column in _table_columns(cursor, "main", table) if column not in local]
+
+
+def _prepare_archive_tables(cursor: sqlite3.Cursor) -> None:
+    """
+    Create the archived tables in the attached database with the same
+    columns as the hot ones (minus shard-local ones), adding columns
+    introduced since the archive was created.
+    """
+    for table in ARCHIVED_TABLES:
+        hot_columns = _archived_columns(cursor, table)
+        archived_columns = _table_columns(cursor, "archive", table)
+        if not archived_columns:
+            cursor.execute(
+                f"CREATE TABLE archive.{table} AS "
+                f"SELECT {', '.join(hot_columns)} FROM main.{table} WHERE 0"
+            )
+        for column in hot_columns:
+            if archived_columns and column not in archived_columns:
+                cursor.execute(f"ALTER TABLE archive.{table} ADD COLUMN {column}")
+        keys = ARCHIVE_KEYS[table]
+        if keys != ("id",):
+            # Archives created before the table was keyed like this
+            cursor.execute(f"DROP INDEX IF EXISTS archive.idx_{table}_id")
+        cursor.execute(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS archive.idx_{table}_{'_'.join(keys)} "
+            f"ON {table} ({', '.join(keys)})"
+        )
+
+
+def _select_candidates(cursor: sqlite3.Cursor, max_age_days: int) -> None:
+    """
+    Fill temp tables with the rows to move, tagged by archive month.
+    A plan is completed when neither it nor any of its days were written
+    within the retention period and all its orders are archivable too.
+    """
+    modifier = f"-{int(max_age_days)} days"
+    cursor.execute("DROP TABLE IF EXISTS temp.archived_orders")
+    cursor.execute("DROP TABLE IF EXISTS temp.archived_preferences")
+    cursor.execute("""
+        CREATE TEMP TABLE archived_orders AS
+        SELECT id, strftime('%Y-%m', created_at) AS month
+        FROM orders
+        WHERE status = 'delivered' AND created_at < datetime('now', ?)
+    """, (modifier,))
+    cursor.execute("""
+        CREATE TEMP TABLE archived_preferences AS
+        SELECT p.id, strftime('%Y-%m', p.created_at) AS month
+        FROM preferences p
+        WHERE p.created_at < datetime('now', ?1)
+          AND NOT EXISTS (
+              SELECT 1 FROM menu_history h
+              WHERE h.preference_id = p.id AND h.created_at >= datetime('now', ?1)
+          )
+          AND NOT EXISTS (
+              SELECT 1 FROM orders o
+              WHERE o.preference_id = p.id
+                AND o.id NOT IN (SELECT id FROM temp.archived_orders)
+          )
+    """, (modifier,))
+
+
+def _move_month(cursor: sqlite3.Cursor, month: str) -> Dict[str, int]:
+    """Copy one month of candidate rows into the attached archive and delete them."""
+    selections = {
+        "preferences": "id IN (SELECT id FROM temp.archived_preferences WHERE month = ?)",
+        "menu_history": "preference_id IN (SELECT id FROM temp.archived_preferences WHERE month = ?)",
+        "orders": "id IN (SELECT id FROM temp.archived_orders WHERE month = ?)",
+    }
+    moved = {}
+    for table in ARCHIVED_TABLES:
+        columns = ", ".join(_archived_columns(cursor, table))
+        where = selections[table]
+        cursor.execute(
+            f"INSERT OR REPLACE INTO archive.{table} ({columns}) "
+            f"SELECT {columns} FROM main.{table} WHERE {where}",
+            (month,),
+        )
+        cursor.execute(f"DELETE FROM main.{table} WHERE {where}", (month,))
+        moved[table] = cursor.rowcount
+    return moved
+
+
+def incremental_vacuum(conn: sqlite3.Connection) -> None:
+    """
+    Return free pages of the hot database to the file system.
+    Databases created before auto_vacuum was enabled are converted once
+    with a full VACUUM; afterwards only incremental vacuum is needed.
+    """
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA auto_vacuum")
+    if cursor.fetchone()[0] != 2:
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        cursor.execute("VACUUM")
+    else:
+        cursor.execute("PRAGMA incremental_vacuum")
+        cursor.fetchall()
+
+
+def run_archival(max_age_days: int = ARCHIVE_AFTER_DAYS, dry_run: bool = False) -> Dict[str, int]:
+    """
+    Move completed plans and delivered orders older than max_age_days into
+    monthly archive databases and vacuum the hot database of every shard.
+    Returns the number of moved rows per table.
+    """
+    totals = {table: 0 for table in ARCHIVED_TABLES}
+    for shard in models.shard_ids():
+        for table, count in _archive_shard(shard, max_age_days, dry_run).items():
+            totals[table] += count
+    return totals
+
+
+def _archive_shard(shard: int, max_age_days: int, dry_run: bool) -> Dict[str, int]:
+    """
+    Archive one shard. Archived rows are keyed by ARCHIVE_KEYS, which are
+    unique across shards, so all shards share the monthly archives.
+    """
+    conn = models.get_connection(shard)
+    cursor = conn.cursor()
+    _select_candidates(cursor, max_age_days)
+    cursor.execute("""
+        SELECT month FROM temp.archived_preferences
+        UNION
+        SELECT month FROM temp.archived_orders
+    """)
+    months = [row[0] for row in cursor.fetchall()]
+
+    totals = {table: 0 for table in ARCHIVED_TABLES}
+    if dry_run:
+        cursor.execute("SELECT COUNT(*) FROM temp.archived_preferences")
+        totals["preferences"] = cursor.fetchone()[0]
+        cursor.execute("""
+            SELECT COUNT(*) FROM menu_history
+            WHERE preference_id IN (SELECT id FROM temp.archived_preferences)
+        """)
+        totals["menu_history"] = cursor.fetchone()[0]
+        cursor.execute("SELECT COUNT(*) FROM temp.archived_orders")
+        totals["orders"] = cursor.fetchone()[0]
+        conn.close()
+        return totals
+
+    ARCHIVE_DIR.mkdir(exist_ok=True)
+    for month in months:
+        # ATTACH is not allowed inside a transaction
+        conn.commit()
+        cursor.execute("ATTACH DATABASE ? AS archive", (str(archive_path(month)),))
+        try:
+            _prepare_archive_tables(cursor)
+            for table, count in _move_month(cursor, month).items():
+                totals[table] += count
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.execute("DETACH DATABASE archive")
+
+    conn.commit()
+    incremental_vacuum(conn)
+    conn.close()
+    return totals
+
+
+# ---------------------------------------------------------------------------
+# Read-through lookups
+# ---------------------------------------------------------------------------
+
+
+def _open_archive(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _query_archives(query: str, params: tuple) -> List[sqlite3.Row]:
+    """Run a query against archives, newest first, until one returns rows."""
+    for path in list_archives():
+        conn = _open_archive(path)
+        try:
+            rows = conn.execute(query, params).fetchall()
+        except sqlite3.OperationalError:
+            # Archive without this table yet
+            rows = []
+        finally:
+            conn.close()
+        if rows:
+            return rows
+    return []
+
+
+def find_preference(preference_id: int) -> Optional[Dict[str, Any]]:
+    """Get a preferences record from the hot database or the archives."""
+    preference = models.get_preference(preference_id)
+    if preference is not None:
+        return preference
+    # Older archives may lack columns added since, so select all of them
+    rows = _query_archives("SELECT * FROM preferences WHERE id = ?", (preference_id,))
+    return models.preference_from_row(rows[0]) if rows else None
+
+
+def find_plan_days(preference_id: int) -> List[Dict[str, Any]]:
+    """Get all days of a plan from the hot database or the archives."""
+    days = models.get_plan_days(preference_id)
+    if days:
+        return days
+    rows = _query_archives("""
+        SELECT day_number, menu_json, total_calories, total_proteins, total_fats, total_carbs
+        FROM menu_history WHERE preference_id = ?
+        ORDER BY day_number
+    """, (preference_id,))
+    return [
+        {
+            "day_number": row["day_number"],
+            "menu": json.loads(row["menu_json"]),
+            "total_calories": row["total_calories"],
+            "total_proteins": row["total_proteins"],
+            "total_fats": row["total_fats"],
+            "total_carbs": row["total_carbs"],
+        }
+        for row in rows
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Archive old FoodFit plans and orders.")
+    parser.add_argument(
+        "--older-than", type=int, default=ARCHIVE_AFTER_DAYS,
+        help="archive rows older than this many days (default: %(default)s)",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="only count rows to archive")
+    args = parser.parse_args()
+
+    totals = run_archival(args.older_than, dry_run=args.dry_run)
+    for table, count in totals.items():
+        print(f"{table}: {count}")
+
+
+if __name__ == "__main__":
+    main()
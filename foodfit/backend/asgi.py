@@ -0,0 +1,293 @@
+"""
+Optional asyncio serving mode for FoodFit.
+A plain ASGI application that serves /, /api/snacks, /api/preferences and
+/api/order without tying up a thread per connection: SQLite calls run on a
+dedicated thread pool sized like the connection pool, and only the plan
+generation itself runs in a small process pool. Bodies come from the same handlers and JSON provider
+as the Flask app, so responses are byte-for-byte identical. Every other
+request (frontend files, listings, CORS preflight, ...) is handed to the
+Flask app on a worker thread.
+
+    pip install uvicorn
+    uvicorn asgi:app --workers 4
+
+Compare both modes with bench_async.py.
+"""
+
+import asyncio
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import app as flask_module
+import idempotency
+import models
+
+# Threads running SQLite calls; more would only wait for pooled connections
+DB_THREADS = int(os.environ.get("FOODFIT_DB_THREADS", str(models.POOL_SIZE)))
+# Every uvicorn worker has its own generation pool, so the default stays
+# small; set it to about the number of cores divided by the workers
+GENERATION_PROCESSES = int(
+    os.environ.get("FOODFIT_GENERATION_PROCESSES", str(min(os.cpu_count() or 1, 2)))
+)
+JSON_CONTENT_TYPE = "application/json"
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+# (status, content_type, body), the shape idempotency.run() stores
+Result = Tuple[int, str, bytes]
+
+flask_app = flask_module.app
+_executors: Dict[str, Executor] = {}
+_executors_lock = threading.Lock()
+
+
+def _executor(name: str) -> Executor:
+    """Executors are created on first use, after uvicorn forked its workers."""
+    with _executors_lock:
+        executor = _executors.get(name)
+        if executor is None:
+            if name == "db":
+                executor = ThreadPoolExecutor(DB_THREADS, thread_name_prefix="foodfit-db")
+            elif name == "generation":
+                # spawn: forked children would inherit pooled SQLite connections
+                executor = ProcessPoolExecutor(
+                    GENERATION_PROCESSES, mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                # Blocking waits (idempotency polling, plan requests, Flask fallback)
+                executor = ThreadPoolExecutor(thread_name_prefix="foodfit-blocking")
+            _executors[name] = executor
+        return executor
+
+
+def _shutdown_executors() -> None:
+    while _executors:
+        _executors.popitem()[1].shutdown(wait=True)
+
+
+async def run_in(name: str, func: Callable, *args: Any) -> Any:
+    """Await func(*args) on one of the executors."""
+    return await asyncio.get_running_loop().run_in_executor(_executor(name), partial(func, *args))
+
+
+def json_body(data: Any) -> bytes:
+    """Encode exactly like flask.jsonify()."""
+    return flask_app.json.response(data).get_data()
+
+
+def parse_payload(raw: bytes) -> Dict[str, Any]:
+    """Same as request.get_json(force=True, silent=True) or {}."""
+    try:
+        return json.loads(raw) or {}
+    except ValueError:
+        return {}
+
+
+def preferences_job(raw: bytes) -> Result:
+    """
+    POST /api/preferences; runs on a blocking thread. Database reads and
+    writes go to the DB threads and only the generation to a process, while
+    this thread holds the in-process flight that identical requests share.
+    """
+    plan = _executor("db").submit(flask_module.read_plan_request, parse_payload(raw)).result()
+    if plan is None:
+        return 400, JSON_CONTENT_TYPE, json_body({"error": flask_module.USER_NAME_REQUIRED_ERROR})
+    days = flask_module.generate_plan_days_shared(*plan.generation, executor=_executor("generation"))
+    return _executor("db").submit(save_plan_job, plan, days).result()
+
+
+def save_plan_job(plan: "flask_module.PlanRequest", days: List[Dict[str, Any]]) -> Result:
+    """Store a generated plan; runs on a DB thread."""
+    body, status = flask_module.save_plan(plan, days)
+    return status, JSON_CONTENT_TYPE, json_body(body)
+
+
+def order_job(raw: bytes) -> Result:
+    """POST /api/order; runs on a DB thread."""
+    body, status = flask_module.handle_order(parse_payload(raw))
+    return status, JSON_CONTENT_TYPE, json_body(body)
+
+
+def snacks_job() -> Result:
+    return 200, JSON_CONTENT_TYPE, json_body({"snacks": models.fetch_snacks()})
+
+
+ROOT_RESPONSE: Result = (200, JSON_CONTENT_TYPE, json_body({"status": "ok", "service": "FoodFit API"}))
+
+
+def _header(scope: Scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+async def _read_body(receive: Receive) -> bytes:
+    chunks: List[bytes] = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def _send_response(
+    scope: Scope, send: Send, result: Result, extra_headers: Tuple[Tuple[bytes, bytes], ...] = ()
+) -> None:
+    status, content_type, body = result
+    headers = [
+        (b"content-type", content_type.encode("latin-1")),
+        (b"content-length", str(len(body)).encode("latin-1")),
+        *extra_headers,
+    ]
+    # What flask-cors adds to simple requests with the default CORS(app)
+    origin = _header(scope, b"origin")
+    if origin is None:
+        headers.append((b"access-control-allow-origin", b"*"))
+    else:
+        headers.append((b"access-control-allow-origin", origin.encode("latin-1")))
+        headers.append((b"vary", b"Origin"))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+def _idempotency_key(scope: Scope) -> str:
+    return (_header(scope, idempotency.HEADER.lower().encode("latin-1")) or "").strip()
+
+
+async def _idempotent(
+    scope: Scope, send: Send, endpoint: str, key: str, raw: bytes, compute: Callable[[], Result]
+) -> None:
+    """Async counterpart of idempotency.idempotent() around a blocking compute()."""
+    if len(key) > idempotency.MAX_KEY_LENGTH:
+        await _send_response(
+            scope, send, (400, JSON_CONTENT_TYPE, json_body({"error": idempotency.INVALID_KEY_ERROR}))
+        )
+        return
+
+    fingerprint = hashlib.sha256(raw).hexdigest()
+    try:
+        stored, replayed = await run_in("blocking", idempotency.run, endpoint, key, fingerprint, compute)
+    except idempotency.KeyReuseError:
+        await _send_response(
+            scope, send, (422, JSON_CONTENT_TYPE, json_body({"error": idempotency.KEY_REUSED_ERROR}))
+        )
+        return
+    extra = ((b"idempotent-replayed", b"true"),) if replayed else ()
+    await _send_response(scope, send, (stored.status, stored.content_type, stored.body), extra)
+
+
+async def preferences_endpoint(scope: Scope, receive: Receive, send: Send) -> None:
+    raw = await _read_body(receive)
+    key = _idempotency_key(scope)
+    if key:
+        await _idempotent(scope, send, "preferences", key, raw, partial(preferences_job, raw))
+        return
+    await _send_response(scope, send, await run_in("blocking", preferences_job, raw))
+
+
+async def order_endpoint(scope: Scope, receive: Receive, send: Send) -> None:
+    raw = await _read_body(receive)
+    key = _idempotency_key(scope)
+    if key:
+        await _idempotent(scope, send, "order", key, raw, partial(order_job, raw))
+        return
+    await _send_response(scope, send, await run_in("db", order_job, raw))
+
+
+async def snacks_endpoint(scope: Scope, receive: Receive, send: Send) -> None:
+    await _send_response(scope, send, await run_in("db", snacks_job))
+
+
+async def root_endpoint(scope: Scope, receive: Receive, send: Send) -> None:
+    await _send_response(scope, send, ROOT_RESPONSE)
+
+
+ROUTES = {
+    ("GET", "/"): root_endpoint,
+    ("GET", "/api/snacks"): snacks_endpoint,
+    ("POST", "/api/preferences"): preferences_endpoint,
+    ("POST", "/api/order"): order_endpoint,
+}
+
+
+def _wsgi_environ(scope: Scope, body: bytes) -> Dict[str, Any]:
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", ""),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for key, value in scope["headers"]:
+        name = key.decode("latin-1").upper().replace("-", "_")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = f"HTTP_{name}"
+        decoded = value.decode("latin-1")
+        environ[name] = f"{environ[name]},{decoded}" if name in environ else decoded
+    return environ
+
+
+async def flask_fallback(scope: Scope, receive: Receive, send: Send) -> None:
+    """Serve any other request with the Flask app, streaming its body."""
+    environ = _wsgi_environ(scope, await _read_body(receive))
+    started: List[Any] = []
+
+    def start_response(status: str, headers: List[Tuple[str, str]], exc_info: Any = None) -> None:
+        started[:] = [int(status.split(" ", 1)[0]), headers]
+
+    iterable = await run_in("blocking", flask_app, environ, start_response)
+    iterator = iter(iterable)
+    try:
+        # The first chunk is fetched before start_response is relied upon
+        chunk = await run_in("blocking", next, iterator, None)
+        status, headers = started
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+        })
+        while chunk is not None:
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            chunk = await run_in("blocking", next, iterator, None)
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        close = getattr(iterable, "close", None)
+        if close is not None:
+            await run_in("blocking", close)
+
+
+async def app(scope: Scope, receive: Receive, send: Send) -> None:
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await asyncio.get_running_loop().run_in_executor(None, _shutdown_executors)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+    handler = ROUTES.get((scope["method"], scope["path"]), flask_fallback)
+    await handler(scope, receive, send)
@@ -0,0 +1,151 @@
+"""
+Load comparison of the sync (gunicorn + Flask) and async (uvicorn + asgi.py)
+serving modes. Start both servers on the same database, then:
+
+    gunicorn app:app --workers 4 --threads 8 --bind 127.0.0.1:8000
+    uvicorn asgi:app --workers 4 --port 8001
+    python bench_async.py --sync http://127.0.0.1:8000 --async http://127.0.0.1:8001
+
+Each endpoint is hit by --concurrency keep-alive connections until
+--requests responses arrived; throughput and latency percentiles are printed
+per mode. Uses only the standard library.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+ORDER_BODY = json.dumps({
+    "user_name": "Навантаження",
+    "phone": "+380671112233",
+    "address": "Київ, вул. Смачна, 1",
+    "delivery_time": "18:30",
+    "items": [{"name": "Вівсянка з ягодами", "calories": 350}],
+    "total_calories": 350,
+}, ensure_ascii=False).encode("utf-8")
+PREFERENCES_BODY = json.dumps({
+    "user_name": "Навантаження",
+    "calories": 2000,
+    "plan_type": "weekly",
+}, ensure_ascii=False).encode("utf-8")
+
+ENDPOINTS: Dict[str, Tuple[str, str, Optional[bytes]]] = {
+    "root": ("GET", "/", None),
+    "snacks": ("GET", "/api/snacks", None),
+    "order": ("POST", "/api/order", ORDER_BODY),
+    "preferences": ("POST", "/api/preferences", PREFERENCES_BODY),
+}
+
+
+async def _request(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+    host: str, method: str, path: str, body: Optional[bytes],
+) -> int:
+    head = f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n"
+    if body is not None:
+        head += f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+    writer.write(head.encode("latin-1") + b"\r\n" + (body or b""))
+    await writer.drain()
+
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed")
+    status = int(status_line.split()[1])
+    length = 0
+    chunked = False
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        name = name.strip().lower()
+        if name == "content-length":
+            length = int(value)
+        elif name == "transfer-encoding" and "chunked" in value.lower():
+            chunked = True
+    if chunked:
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(length)
+    return status
+
+
+async def _worker(
+    base: str, method: str, path: str, body: Optional[bytes],
+    remaining: List[int], latencies: List[float], errors: List[int],
+) -> None:
+    url = urlsplit(base)
+    connection = None
+    while remaining[0] > 0:
+        remaining[0] -= 1
+        started = time.perf_counter()
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection(url.hostname, url.port or 80)
+            status = await _request(*connection, url.netloc, method, path, body)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError):
+            errors[0] += 1
+            connection = None
+            continue
+        latencies.append(time.perf_counter() - started)
+        if status >= 400:
+            errors[0] += 1
+    if connection is not None:
+        connection[1].close()
+
+
+async def run_load(base: str, endpoint: str, concurrency: int, requests: int) -> Dict[str, float]:
+    method, path, body = ENDPOINTS[endpoint]
+    remaining = [requests]
+    latencies: List[float] = []
+    errors = [0]
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        _worker(base, method, path, body, remaining, latencies, errors)
+        for _ in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0.0,
+        "errors": errors[0],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare sync and async FoodFit serving.")
+    parser.add_argument("--sync", dest="sync_url", help="base URL of the gunicorn server")
+    parser.add_argument("--async", dest="async_url", help="base URL of the uvicorn server")
+    parser.add_argument(
+        "--endpoint", action="append", choices=sorted(ENDPOINTS),
+        help="endpoint to load (repeatable, default: root, snacks, order)",
+    )
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    modes = [(name, url) for name, url in (("sync", args.sync_url), ("async", args.async_url)) if url]
+    if not modes:
+        parser.error("pass --sync and/or --async")
+    print(f"{'endpoint':<12} {'mode':<6} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for endpoint in args.endpoint or ["root", "snacks", "order"]:
+        for mode, url in modes:
+            result = asyncio.run(run_load(url, endpoint, args.concurrency, args.requests))
+            print(
+                f"{endpoint:<12} {mode:<6} {result['rps']:9.0f} {result['p50_ms']:9.1f} "
+                f"{result['p99_ms']:9.1f} {result['errors']:7d}"
+            )
+
+
+if __name__ == "__main__":
+    main()
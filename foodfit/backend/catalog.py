@@ -0,0 +1,320 @@
+"""
+Meal catalog for FoodFit.
+Meals are immutable Meal tuples with interned strings; they are converted to
+dictionaries only when written to JSON. The built-in dishes (DEFAULT_MEALS)
+are extended with meals imported into the database by catalog_import.py and
+compiled into the memory-mapped file served by shared_catalog.py.
+"""
+
+import json
+import sys
+from typing import Any, Dict, Iterable, Mapping, NamedTuple, Sequence, Tuple
+
+MEAL_TYPES = ("breakfast", "lunch", "dinner")
+
+# Sample meals (БЖВ: білки, жири, вуглеводи в грамах)
+DEFAULT_MEALS = {
+    "breakfast": [
+        {
+            "name": "Вівсянка з ягодами",
+            "calories": 350,
+            "proteins": 12,
+            "fats": 8,
+            "carbs": 58,
+            "ingredients": ["вівсянка", "ягоди", "мед"],
+            "tags": ["веган", "швидко"],
+        },
+        {
+            "name": "Омлет зі шпинатом",
+            "calories": 320,
+            "proteins": 22,
+            "fats": 20,
+            "carbs": 8,
+            "ingredients": ["яйця", "шпинат", "сир"],
+            "tags": ["білок", "швидко"],
+        },
+        {
+            "name": "Чіа пудинг з манго",
+            "calories": 280,
+            "proteins": 10,
+            "fats": 15,
+            "carbs": 32,
+            "ingredients": ["чіа", "кокосове молоко", "манго"],
+            "tags": ["веган", "без глютену"],
+        },
+        {
+            "name": "Грецький йогурт з горіхами",
+            "calories": 380,
+            "proteins": 20,
+            "fats": 18,
+            "carbs": 32,
+            "ingredients": ["грецький йогурт", "горіхи", "мед"],
+            "tags": ["білок", "швидко"],
+        },
+        {
+            "name": "Тост з авокадо та яйцем",
+            "calories": 340,
+            "proteins": 16,
+            "fats": 22,
+            "carbs": 28,
+            "ingredients": ["хліб цільнозерновий", "авокадо", "яйце"],
+            "tags": ["білок", "корисні жири"],
+        },
+        {
+            "name": "Сирники з ягодами",
+            "calories": 360,
+            "proteins": 18,
+            "fats": 12,
+            "carbs": 42,
+            "ingredients": ["сир", "борошно", "ягоди"],
+            "tags": ["білок", "молочні"],
+        },
+        {
+            "name": "Смузі боул",
+            "calories": 300,
+            "proteins": 8,
+            "fats": 10,
+            "carbs": 48,
+            "ingredients": ["банани", "шпинат", "ягоди", "чіа"],
+            "tags": ["веган", "швидко"],
+        },
+    ],
+    "lunch": [
+        {
+            "name": "Лосось із кіноа",
+            "calories": 520,
+            "proteins": 35,
+            "fats": 18,
+            "carbs": 52,
+            "ingredients": ["лосось", "кіноа", "овочі"],
+            "tags": ["білок", "омега-3"],
+        },
+        {
+            "name": "Курка з булгуром",
+            "calories": 480,
+            "proteins": 38,
+            "fats": 12,
+            "carbs": 48,
+            "ingredients": ["курка", "булгур", "овочі"],
+            "tags": ["білок", "швидко"],
+        },
+        {
+            "name": "Тофу боул",
+            "calories": 450,
+            "proteins": 22,
+            "fats": 15,
+            "carbs": 58,
+            "ingredients": ["тофу", "рис", "овочі", "соєвий соус"],
+            "tags": ["веган", "білок"],
+        },
+        {
+            "name": "Індичка з бататом та брокколі",
+            "calories": 460,
+            "proteins": 40,
+            "fats": 10,
+            "carbs": 42,
+            "ingredients": ["індичка", "батат", "брокколі"],
+            "tags": ["білок", "низькі вуглеводи"],
+        },
+        {
+            "name": "Вегетаріанський бургер",
+            "calories": 440,
+            "proteins": 18,
+            "fats": 16,
+            "carbs": 56,
+            "ingredients": ["котлета з бобів", "булочка", "овочі"],
+            "tags": ["веган", "швидко"],
+        },
+        {
+            "name": "Грецький салат з куркою",
+            "calories": 420,
+            "proteins": 32,
+            "fats": 20,
+            "carbs": 28,
+            "ingredients": ["курка", "помидори", "огірки", "фета", "оливкова олія"],
+            "tags": ["білок", "свіжість"],
+        },
+        {
+            "name": "Паста з морепродуктами",
+            "calories": 500,
+            "proteins": 28,
+            "fats": 14,
+            "carbs": 62,
+            "ingredients": ["паста", "креветки", "помідори", "часник"],
+            "tags": ["білок", "морепродукти"],
+        },
+        {
+            "name": "Рататуй з рибною котлетою",
+            "calories": 470,
+            "proteins": 30,
+            "fats": 16,
+            "carbs": 46,
+            "ingredients": ["риба", "баклажани", "кабачки", "помідори"],
+            "tags": ["білок", "овочі"],
+        },
+    ],
+    "dinner": [
+        {
+            "name": "Місо суп з локшиною",
+            "calories": 380,
+            "proteins": 16,
+            "fats": 8,
+            "carbs": 58,
+            "ingredients": ["місо", "локшина", "водорості", "тофу"],
+            "tags": ["веган", "легко"],
+        },
+        {
+            "name": "Запечені овочі",
+            "calories": 320,
+            "proteins": 8,
+            "fats": 12,
+            "carbs": 48,
+            "ingredients": ["батат", "брокколі", "перець", "оливкова олія"],
+            "tags": ["веган", "без глютену"],
+        },
+        {
+            "name": "Індичка з бататом",
+            "calories": 420,
+            "proteins": 36,
+            "fats": 10,
+            "carbs": 38,
+            "ingredients": ["індичка", "батат", "брокколі"],
+            "tags": ["білок", "низькі вуглеводи"],
+        },
+        {
+            "name": "Овочева запіканка з сиром",
+            "calories": 350,
+            "proteins": 20,
+            "fats": 18,
+            "carbs": 28,
+            "ingredients": ["кабачки", "помідори", "сир", "яйця"],
+            "tags": ["білок", "легко"],
+        },
+        {
+            "name": "Рибний суп",
+            "calories": 340,
+            "proteins": 28,
+            "fats": 10,
+            "carbs": 32,
+            "ingredients": ["риба", "овочі", "рис"],
+            "tags": ["білок", "легко"],
+        },
+        {
+            "name": "Салат з тунцем",
+            "calories": 360,
+            "proteins": 32,
+            "fats": 14,
+            "carbs": 24,
+            "ingredients": ["тунець", "листя салату", "овочі", "оливкова олія"],
+            "tags": ["білок", "легко"],
+        },
+        {
+            "name": "Грибна юшка з крупяною кашею",
+            "calories": 330,
+            "proteins": 12,
+            "fats": 8,
+            "carbs": 52,
+            "ingredients": ["гриби", "крупа", "овочі"],
+            "tags": ["веган", "легко"],
+        },
+        {
+            "name": "Курячий салат з авокадо",
+            "calories": 380,
+            "proteins": 30,
+            "fats": 20,
+            "carbs": 18,
+            "ingredients": ["курка", "авокадо", "листя салату", "овочі"],
+            "tags": ["білок", "низькі вуглеводи"],
+        },
+    ],
+}
+
+
+def search_terms_for(name: str, ingredients: Sequence[str]) -> Tuple[str, ...]:
+    """Lowercased name and ingredients used for preference matching."""
+    return tuple(sys.intern(term.lower()) for term in (name, *ingredients))
+
+
+class Meal(NamedTuple):
+    """A catalog dish. Macros (БЖВ) are whole grams."""
+
+    name: str
+    calories: int
+    proteins: int
+    fats: int
+    carbs: int
+    ingredients: Tuple[str, ...]
+    tags: Tuple[str, ...]
+    # Lowercased name and ingredients used for preference matching
+    search_terms: Tuple[str, ...]
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Meal":
+        """Build a meal from its JSON dictionary form."""
+        name = sys.intern(str(data.get("name", "")))
+        ingredients = tuple(sys.intern(str(item)) for item in data.get("ingredients") or ())
+        return cls(
+            name=name,
+            calories=int(data.get("calories") or 0),
+            proteins=int(data.get("proteins") or 0),
+            fats=int(data.get("fats") or 0),
+            carbs=int(data.get("carbs") or 0),
+            ingredients=ingredients,
+            tags=tuple(sys.intern(str(tag)) for tag in data.get("tags") or ()),
+            search_terms=search_terms_for(name, ingredients),
+        )
+
+    @classmethod
+    def from_row(cls, row: Mapping[str, Any]) -> "Meal":
+        """Build a meal from a meals table row; search terms come precomputed."""
+        return cls(
+            name=sys.intern(row["name"]),
+            calories=row["calories"],
+            proteins=row["proteins"],
+            fats=row["fats"],
+            carbs=row["carbs"],
+            ingredients=tuple(sys.intern(item) for item in json.loads(row["ingredients_json"])),
+            tags=tuple(sys.intern(tag) for tag in json.loads(row["tags_json"])),
+            search_terms=tuple(sys.intern(term) for term in json.loads(row["search_terms_json"])),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON dictionary form of the meal, as returned by the API."""
+        return {
+            "name": self.name,
+            "calories": self.calories,
+            "proteins": self.proteins,
+            "fats": self.fats,
+            "carbs": self.carbs,
+            "ingredients": list(self.ingredients),
+            "tags": list(self.tags),
+        }
+
+
+def build_library(raw_library: Dict[str, Iterable[Dict[str, Any]]]) -> Dict[str, Tuple[Meal, ...]]:
+    """Convert a meal_type -> list of meal dictionaries mapping into Meal tuples."""
+    return {
+        meal_type: tuple(Meal.from_dict(data) for data in meals)
+        for meal_type, meals in raw_library.items()
+    }
+
+
+def merge_library(
+    library: Dict[str, Tuple[Meal, ...]],
+    extra: Iterable[Tuple[str, Meal]],
+) -> Dict[str, Tuple[Meal, ...]]:
+    """
+    Add (meal_type, meal) pairs to a library. A meal with the name of an
+    existing one replaces it, also when it moves to another meal type.
+    """
+    merged: Dict[str, Dict[str, Meal]] = {
+        meal_type: {meal.name: meal for meal in meals} for meal_type, meals in library.items()
+    }
+    meal_types = {meal.name: meal_type for meal_type, meals in library.items() for meal in meals}
+    for meal_type, meal in extra:
+        previous_type = meal_types.get(meal.name)
+        if previous_type is not None and previous_type != meal_type:
+            del merged[previous_type][meal.name]
+        merged.setdefault(meal_type, {})[meal.name] = meal
+        meal_types[meal.name] = meal_type
+    return {meal_type: tuple(meals.values()) for meal_type, meals in merged.items()}
@@ -0,0 +1,199 @@
+"""
+Bulk import of meals and snacks from CSV or JSON Lines files.
+Rows are streamed, validated (macros must add up to the stated calories) and
+upserted by name in large transactions, so memory use is bounded by the
+batch size. Search terms are derived at import time and stored with the
+meal, so loading the catalog does not recompute them.
+
+    python catalog_import.py meals dishes.csv
+    python catalog_import.py snacks snacks.jsonl --dry-run
+
+Columns / keys: name, meal_type (meals only: breakfast, lunch or dinner),
+calories, proteins, fats, carbs, ingredients and tags (meals; lists, or
+";"-separated in CSV), description and image (snacks). After a meals import
+the shared catalog file is recompiled and swapped in; running workers serve
+the new meals within shared_catalog.RELOAD_INTERVAL seconds.
+"""
+
+import argparse
+import csv
+import json
+import math
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import catalog
+import models
+import shared_catalog
+
+BATCH_SIZE = 5000
+# Allowed difference between stated calories and 4*P + 9*F + 4*C
+MACRO_TOLERANCE = 0.15
+MIN_TOLERANCE_CALORIES = 20
+LIST_SEPARATOR = ";"
+MAX_REPORTED_ERRORS = 20
+
+
+class InvalidRow(ValueError):
+    """A catalog row that cannot be imported."""
+
+
+def read_records(path: Path, fmt: Optional[str] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Yield (line number, record) from a CSV or JSON Lines file."""
+    fmt = fmt or ("csv" if path.suffix.lower() == ".csv" else "jsonl")
+    with path.open(encoding="utf-8-sig", newline="") as source:
+        if fmt == "csv":
+            reader = csv.DictReader(source)
+            for record in reader:
+                yield reader.line_num, record
+            return
+        for line_number, line in enumerate(source, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield line_number, record if isinstance(record, dict) else {"_invalid": line}
+
+
+def _text(record: Dict[str, Any], field: str) -> str:
+    value = record.get(field)
+    return "" if value is None else str(value).strip()
+
+
+def _grams(record: Dict[str, Any], field: str) -> int:
+    """Non-negative whole number of a numeric field."""
+    try:
+        value = float(_text(record, field) or 0)
+    except ValueError:
+        raise InvalidRow(f"{field} is not a number") from None
+    if not math.isfinite(value):
+        raise InvalidRow(f"{field} is not a finite number")
+    if value < 0:
+        raise InvalidRow(f"{field} is negative")
+    return round(value)
+
+
+def _list(record: Dict[str, Any], field: str) -> List[str]:
+    value = record.get(field) or []
+    if isinstance(value, str):
+        value = value.split(LIST_SEPARATOR)
+    return [str(item).strip() for item in value if str(item).strip()]
+
+
+def _nutrients(record: Dict[str, Any], tolerance: float) -> Tuple[int, int, int, int]:
+    """Validated (calories, proteins, fats, carbs)."""
+    calories = _grams(record, "calories")
+    proteins, fats, carbs = (_grams(record, field) for field in ("proteins", "fats", "carbs"))
+    if calories <= 0:
+        raise InvalidRow("calories must be positive")
+    from_macros = 4 * proteins + 9 * fats + 4 * carbs
+    if abs(from_macros - calories) > max(calories * tolerance, MIN_TOLERANCE_CALORIES):
+        raise InvalidRow(f"macros give {from_macros} kcal, stated {calories}")
+    return calories, proteins, fats, carbs
+
+
+def meal_row(record: Dict[str, Any], tolerance: float = MACRO_TOLERANCE) -> Tuple[Any, ...]:
+    """Row in models.MEAL_COLUMNS order with precomputed search terms."""
+    name = _text(record, "name")
+    if not name:
+        raise InvalidRow("name is empty")
+    meal_type = _text(record, "meal_type").lower()
+    if meal_type not in catalog.MEAL_TYPES:
+        raise InvalidRow(f"unknown meal_type {meal_type!r}")
+    ingredients = _list(record, "ingredients")
+    return (
+        name,
+        meal_type,
+        *_nutrients(record, tolerance),
+        json.dumps(ingredients, ensure_ascii=False),
+        json.dumps(_list(record, "tags"), ensure_ascii=False),
+        json.dumps(catalog.search_terms_for(name, ingredients), ensure_ascii=False),
+    )
+
+
+def snack_row(record: Dict[str, Any], tolerance: float = MACRO_TOLERANCE) -> Tuple[Any, ...]:
+    """Row in models.SNACK_COLUMNS order."""
+    name = _text(record, "name")
+    if not name:
+        raise InvalidRow("name is empty")
+    return (name, *_nutrients(record, tolerance), _text(record, "description"), _text(record, "image"))
+
+
+KINDS: Dict[str, Tuple[Callable[..., Tuple[Any, ...]], Callable[[List[Tuple[Any, ...]]], None]]] = {
+    "meals": (meal_row, models.upsert_meals),
+    "snacks": (snack_row, models.upsert_snacks),
+}
+
+
+def import_file(
+    kind: str,
+    path: Path,
+    fmt: Optional[str] = None,
+    batch_size: int = BATCH_SIZE,
+    tolerance: float = MACRO_TOLERANCE,
+    dry_run: bool = False,
+) -> Dict[str, int]:
+    """
+    Import meals or snacks from a file. Later rows win over earlier rows
+    with the same name. Returns counts of read, imported, invalid and
+    duplicate rows; invalid rows are reported on stderr.
+    """
+    to_row, upsert = KINDS[kind]
+    counts = {"read": 0, "imported": 0, "invalid": 0, "duplicates": 0}
+    # name -> row, deduplicated within the batch
+    batch: Dict[str, Tuple[Any, ...]] = {}
+
+    def flush() -> None:
+        if batch and not dry_run:
+            upsert(list(batch.values()))
+        counts["imported"] += len(batch)
+        batch.clear()
+
+    for line_number, record in read_records(path, fmt):
+        counts["read"] += 1
+        try:
+            if "_invalid" in record:
+                raise InvalidRow("not a JSON object")
+            row = to_row(record, tolerance)
+        except InvalidRow as error:
+            counts["invalid"] += 1
+            if counts["invalid"] <= MAX_REPORTED_ERRORS:
+                print(f"{path}:{line_number}: {error}", file=sys.stderr)
+            continue
+        if row[0] in batch:
+            counts["duplicates"] += 1
+            del batch[row[0]]
+        batch[row[0]] = row
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    if kind == "meals" and counts["imported"] and not dry_run:
+        shared_catalog.rebuild()
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import FoodFit meals or snacks.")
+    parser.add_argument("kind", choices=sorted(KINDS))
+    parser.add_argument("path", type=Path, help="CSV or JSON Lines file")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="default: from the file suffix")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="rows per transaction")
+    parser.add_argument(
+        "--tolerance", type=float, default=MACRO_TOLERANCE,
+        help="allowed relative calorie mismatch of the macros (default: %(default)s)",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="only validate the file")
+    args = parser.parse_args()
+
+    counts = import_file(
+        args.kind, args.path, args.format, max(args.batch_size, 1), args.tolerance, args.dry_run
+    )
+    for name, count in counts.items():
+        print(f"{name}: {count}")
+
+
+if __name__ == "__main__":
+    main()
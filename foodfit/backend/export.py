@@ -0,0 +1,94 @@
+"""
+Streaming export of FoodFit orders and preferences as CSV or NDJSON.
+Rows are read with keyset pagination and written in chunks, so memory use
+does not depend on the size of the table. Used by GET /api/export/<table>
+and from the command line:
+
+    python export.py orders --format csv --status delivered --from 2025-01-01 > orders.csv
+"""
+
+import argparse
+import csv
+import io
+import json
+import sqlite3
+import sys
+from typing import Any, Dict, Iterator, Optional
+
+import models
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson; charset=utf-8",
+}
+CHUNK_ROWS = 500
+
+
+def _row_to_record(table: str, row: sqlite3.Row) -> Dict[str, Any]:
+    if table == "orders":
+        # items_json is only decoded here, one row at a time
+        return models.order_from_row(row)
+    return models.preference_summary_from_row(row)
+
+
+def stream(
+    table: str,
+    fmt: str = "csv",
+    filters: Optional[Dict[str, Any]] = None,
+    chunk_rows: int = CHUNK_ROWS,
+) -> Iterator[str]:
+    """Yield the export as text chunks of about chunk_rows rows each."""
+    columns = [name.strip() for name in models.LISTING_COLUMNS[table].split(",")]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == "csv" else None
+    if writer is not None:
+        # CSV keeps items_json as the stored JSON text
+        writer.writerow(columns)
+
+    pending = 0
+    for row in models.iter_rows(table, filters, chunk_size=chunk_rows):
+        if writer is not None:
+            writer.writerow([row[column] for column in columns])
+        else:
+            buffer.write(json.dumps(_row_to_record(table, row), ensure_ascii=False))
+            buffer.write("\n")
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export FoodFit orders or preferences.")
+    parser.add_argument("table", choices=sorted(models.LISTING_COLUMNS))
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--status", help="orders only: filter by status")
+    parser.add_argument("--user-name", help="preferences only: filter by user name")
+    parser.add_argument("--plan-type", help="preferences only: filter by plan type")
+    parser.add_argument("--from", dest="date_from", help="first day, YYYY-MM-DD")
+    parser.add_argument("--to", dest="date_to", help="last day, YYYY-MM-DD")
+    parser.add_argument("--out", help="output file (default: stdout)")
+    args = parser.parse_args()
+
+    filters = {
+        "status": args.status,
+        "user_name": args.user_name,
+        "plan_type": args.plan_type,
+        "date_from": args.date_from,
+        "date_to": args.date_to,
+    }
+    out = open(args.out, "w", encoding="utf-8", newline="") if args.out else sys.stdout
+    try:
+        for chunk in stream(args.table, args.format, filters):
+            out.write(chunk)
+    finally:
+        if args.out:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+"""
+Gunicorn settings for FoodFit:
+
+    gunicorn -c gunicorn.conf.py app:app --workers 8
+
+The master compiles the shared meal catalog once before forking, so workers
+only map the file (see shared_catalog.py) instead of each building their own
+copy of the catalog.
+"""
+
+import models
+import shared_catalog
+
+
+def on_starting(server) -> None:
+    shared_catalog.ensure_compiled()
+    # Workers open their own SQLite connections after the fork
+    models.close_pools()
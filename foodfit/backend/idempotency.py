@@ -0,0 +1,242 @@
+"""
+Idempotency-Key support for FoodFit POST endpoints.
+The first request with a key runs normally and its response bytes are stored
+in the idempotency_keys table (fronted by a small in-memory cache). Keys are
+spread over the shards by their hash, so keyed writes do not all queue on
+the writer lock of database.db. Retries with the same key get the stored response back without
+running the handler again; concurrent duplicates wait for the first one.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, NamedTuple, Optional, Tuple
+
+from flask import Response, jsonify, make_response, request
+
+import models
+from singleflight import FlightGroup
+
+HEADER = "Idempotency-Key"
+KEY_TTL = float(os.environ.get("FOODFIT_IDEMPOTENCY_TTL", str(24 * 3600)))
+# A pending key older than this is assumed to belong to a dead worker
+PENDING_TIMEOUT = 30.0
+POLL_INTERVAL = 0.02
+CACHE_SIZE = 1024
+SWEEP_INTERVAL = 60.0
+MAX_KEY_LENGTH = 255
+INVALID_KEY_ERROR = "Некоректний Idempotency-Key."
+KEY_REUSED_ERROR = "Цей Idempotency-Key вже використано для іншого запиту."
+
+
+class StoredResponse(NamedTuple):
+    status: int
+    content_type: str
+    body: bytes
+    fingerprint: str
+    created_at: float
+
+
+class KeyReuseError(Exception):
+    """The key was already used with a different request body."""
+
+
+_cache: "OrderedDict[Tuple[str, str], StoredResponse]" = OrderedDict()
+_cache_lock = threading.Lock()
+_flights = FlightGroup()
+_last_sweep = 0.0
+
+
+def _cache_get(cache_key: Tuple[str, str]) -> Optional[StoredResponse]:
+    with _cache_lock:
+        stored = _cache.get(cache_key)
+        if stored is None:
+            return None
+        if stored.created_at < time.time() - KEY_TTL:
+            del _cache[cache_key]
+            return None
+        _cache.move_to_end(cache_key)
+        return stored
+
+
+def _cache_put(cache_key: Tuple[str, str], stored: StoredResponse) -> None:
+    with _cache_lock:
+        _cache[cache_key] = stored
+        _cache.move_to_end(cache_key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def _shard(key: str) -> int:
+    """Shard that stores a key."""
+    return models.stable_hash(key) % models.SHARD_COUNT
+
+
+def sweep() -> int:
+    """Delete expired keys on every shard and return how many were removed."""
+    now = time.time()
+    removed = 0
+    for shard in models.shard_ids():
+        conn = models.get_connection(shard)
+        cursor = conn.execute("""
+            DELETE FROM idempotency_keys
+            WHERE (state = 'done' AND created_at < ?) OR (state = 'pending' AND created_at < ?)
+        """, (now - KEY_TTL, now - PENDING_TIMEOUT))
+        removed += cursor.rowcount
+        conn.commit()
+        conn.close()
+    return removed
+
+
+def _maybe_sweep() -> None:
+    global _last_sweep
+    now = time.time()
+    if now - _last_sweep >= SWEEP_INTERVAL:
+        _last_sweep = now
+        sweep()
+
+
+def _claim(endpoint: str, key: str, fingerprint: str) -> Optional[StoredResponse]:
+    """
+    Reserve the key for this request. Returns None when reserved, or the
+    stored response once the request that owns the key has finished.
+    """
+    while True:
+        now = time.time()
+        conn = models.get_connection(_shard(key))
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT state, status, content_type, body, fingerprint, created_at
+            FROM idempotency_keys WHERE endpoint = ? AND key = ?
+        """, (endpoint, key))
+        row = cursor.fetchone()
+        if row is not None and row["state"] == "done" and row["created_at"] >= now - KEY_TTL:
+            conn.close()
+            return StoredResponse(
+                row["status"], row["content_type"], bytes(row["body"]),
+                row["fingerprint"], row["created_at"],
+            )
+        if row is not None and row["state"] == "pending" and row["created_at"] >= now - PENDING_TIMEOUT:
+            conn.close()
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        if row is not None:
+            # Expired response or abandoned pending request
+            cursor.execute(
+                "DELETE FROM idempotency_keys WHERE endpoint = ? AND key = ? AND created_at = ?",
+                (endpoint, key, row["created_at"]),
+            )
+        cursor.execute("""
+            INSERT OR IGNORE INTO idempotency_keys (endpoint, key, state, fingerprint, created_at)
+            VALUES (?, ?, 'pending', ?, ?)
+        """, (endpoint, key, fingerprint, now))
+        claimed = cursor.rowcount == 1
+        conn.commit()
+        conn.close()
+        if claimed:
+            return None
+
+
+def _store(endpoint: str, key: str, stored: StoredResponse) -> None:
+    conn = models.get_connection(_shard(key))
+    conn.execute("""
+        UPDATE idempotency_keys
+        SET state = 'done', status = ?, content_type = ?, body = ?, created_at = ?
+        WHERE endpoint = ? AND key = ?
+    """, (stored.status, stored.content_type, stored.body, stored.created_at, endpoint, key))
+    conn.commit()
+    conn.close()
+
+
+def _release(endpoint: str, key: str) -> None:
+    conn = models.get_connection(_shard(key))
+    conn.execute(
+        "DELETE FROM idempotency_keys WHERE endpoint = ? AND key = ? AND state = 'pending'",
+        (endpoint, key),
+    )
+    conn.commit()
+    conn.close()
+
+
+def run(
+    endpoint: str,
+    key: str,
+    fingerprint: str,
+    compute: Callable[[], Tuple[int, str, bytes]],
+) -> Tuple[StoredResponse, bool]:
+    """
+    Return the response for an idempotent request and whether it was
+    replayed. compute() returns (status, content_type, body); server errors
+    are not stored so the client can retry them.
+    Raises KeyReuseError when the key was used with a different request.
+    """
+    cache_key = (endpoint, key)
+    executed = []
+
+    def execute() -> Tuple[StoredResponse, bool]:
+        executed.append(True)
+        stored = _cache_get(cache_key)
+        if stored is None:
+            _maybe_sweep()
+            stored = _claim(endpoint, key, fingerprint)
+        if stored is not None:
+            _cache_put(cache_key, stored)
+            return stored, True
+
+        try:
+            status, content_type, body = compute()
+        except BaseException:
+            _release(endpoint, key)
+            raise
+        stored = StoredResponse(status, content_type, body, fingerprint, time.time())
+        if status >= 500:
+            _release(endpoint, key)
+        else:
+            _store(endpoint, key, stored)
+            _cache_put(cache_key, stored)
+        return stored, False
+
+    stored, replayed = _flights.do(f"{endpoint}\n{key}", execute)
+    if stored.fingerprint != fingerprint:
+        raise KeyReuseError(key)
+    # Threads that waited on another thread's flight got a replayed response
+    return stored, replayed or not executed
+
+
+def idempotent(endpoint: str) -> Callable:
+    """
+    Decorator for Flask views that honours the Idempotency-Key header.
+    Requests without the header are handled as before.
+    """
+    def decorator(view: Callable) -> Callable:
+        @wraps(view)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            key = request.headers.get(HEADER, "").strip()
+            if not key:
+                return view(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return jsonify({"error": INVALID_KEY_ERROR}), 400
+
+            fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+
+            def compute() -> Tuple[int, str, bytes]:
+                response = make_response(view(*args, **kwargs))
+                return response.status_code, response.content_type, response.get_data()
+
+            try:
+                stored, replayed = run(endpoint, key, fingerprint, compute)
+            except KeyReuseError:
+                return jsonify({"error": KEY_REUSED_ERROR}), 422
+
+            response = Response(stored.body, status=stored.status, content_type=stored.content_type)
+            if replayed:
+                response.headers["Idempotent-Replayed"] = "true"
+            return response
+
+        return wrapper
+
+    return decorator
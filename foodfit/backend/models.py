@@ -1,31 +1,243 @@
 """
 Database models and initialization for FoodFit.
 Creates SQLite database with tables for preferences, orders, and snacks.
+
+User data can be split across FOODFIT_SHARDS SQLite files so writes for
+different users do not serialize on one database lock. Each user is routed
+by a stable hash of user_name; shard 0 is database.db and also holds the
+shared reference tables (snacks). With the default of one shard everything
+lives in database.db as before.
 """
 
+import heapq
+import os
+import queue
 import sqlite3
 import json
-from typing import Dict, List, Any, Optional
+import zlib
+from functools import lru_cache
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Tuple
 from pathlib import Path
 
-DB_PATH = Path(__file__).parent / "database.db"
+import profiler
+
+DB_PATH = Path(os.environ.get("FOODFIT_DB_PATH", Path(__file__).parent / "database.db"))
+SHARD_COUNT = max(int(os.environ.get("FOODFIT_SHARDS", "1")), 1)
+# Idle connections kept per shard
+POOL_SIZE = int(os.environ.get("FOODFIT_POOL_SIZE", "8"))
+
+
+def shard_path(shard: int) -> Path:
+    """Database file of a shard."""
+    if shard == 0:
+        return DB_PATH
+    return DB_PATH.with_name(f"database-{shard}.db")
+
+
+def shard_ids() -> range:
+    """All configured shards."""
+    return range(SHARD_COUNT)
+
+
+def stable_hash(user_name: str) -> int:
+    """Hash of a user name that is the same in every process and run."""
+    return zlib.crc32(user_name.encode("utf-8"))
+
+
+def shard_for_user(user_name: str) -> int:
+    """Shard that stores a user's preferences, plan days and orders."""
+    return stable_hash(user_name) % SHARD_COUNT
+
+
+class PooledConnection(sqlite3.Connection):
+    """SQLite connection that goes back to its pool on close()."""
+
+    pool: Optional["ConnectionPool"] = None
+
+    def cursor(self, factory: Any = None) -> sqlite3.Cursor:
+        if factory is None:
+            factory = profiler.TracedCursor if profiler.ENABLED else sqlite3.Cursor
+        return super().cursor(factory)
+
+    def execute(self, sql: str, parameters: Any = ()) -> sqlite3.Cursor:
+        # The C shortcut does not go through cursor(), so route it when profiling
+        if profiler.ENABLED:
+            return self.cursor().execute(sql, parameters)
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql: str, seq_of_parameters: Any) -> sqlite3.Cursor:
+        if profiler.ENABLED:
+            return self.cursor().executemany(sql, seq_of_parameters)
+        return super().executemany(sql, seq_of_parameters)
+
+    def close(self) -> None:
+        if self.in_transaction:
+            self.rollback()
+        if self.pool is None or not self.pool.release(self):
+            super().close()
+
+
+class ConnectionPool:
+    """Keeps up to `size` idle connections to one database file."""
+
+    def __init__(self, path: Path, size: int = POOL_SIZE):
+        self.path = path
+        self._idle: "queue.LifoQueue[PooledConnection]" = queue.LifoQueue(maxsize=size)
+
+    def acquire(self) -> PooledConnection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            conn = sqlite3.connect(
+                str(self.path), factory=PooledConnection, check_same_thread=False
+            )
+            conn.row_factory = sqlite3.Row
+            conn.pool = self
+            if profiler.ENABLED:
+                conn.set_trace_callback(profiler.trace)
+            return conn
+
+    def release(self, conn: PooledConnection) -> bool:
+        try:
+            self._idle.put_nowait(conn)
+            return True
+        except queue.Full:
+            return False
+
+    def close_all(self) -> None:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            conn.pool = None
+            conn.close()
+
 
+_pools: Dict[int, ConnectionPool] = {}
 
-def get_connection():
-    """Get a database connection."""
-    conn = sqlite3.connect(str(DB_PATH))
-    conn.row_factory = sqlite3.Row
-    return conn
+
+def get_connection(shard: int = 0):
+    """Get a pooled database connection to a shard (database.db by default)."""
+    pool = _pools.get(shard)
+    if pool is None:
+        pool = _pools.setdefault(shard, ConnectionPool(shard_path(shard)))
+    return pool.acquire()
+
+
+def close_pools() -> None:
+    """Close all idle pooled connections (e.g. before moving database files)."""
+    for pool in _pools.values():
+        pool.close_all()
+
+
+@lru_cache(maxsize=65536)
+def shard_for_record(table: str, record_id: int) -> int:
+    """
+    Shard that stores a preferences or orders row. New IDs are allocated
+    so that id % SHARD_COUNT is their shard; rows moved by reshard.py keep
+    their IDs, so the other shards are checked when the hint misses.
+    Rows only move while the service is stopped, so lookups are cached.
+    """
+    if SHARD_COUNT == 1:
+        return 0
+    hint = record_id % SHARD_COUNT
+    for shard in [hint] + [other for other in shard_ids() if other != hint]:
+        conn = get_connection(shard)
+        row = conn.execute(f"SELECT 1 FROM {table} WHERE id = ?", (record_id,)).fetchone()
+        conn.close()
+        if row is not None:
+            return shard
+    return hint
+
+
+def _allocate_id(cursor: sqlite3.Cursor, table: str, shard: int) -> Optional[int]:
+    """
+    Pick the next ID for a row in a shard so IDs stay unique across shards
+    and point back to their shard. Must run inside a write transaction.
+    With a single shard SQLite assigns the ID itself.
+    """
+    if SHARD_COUNT == 1:
+        return None
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,))
+    row = cursor.fetchone()
+    next_id = (row[0] if row else 0) + 1
+    return next_id + (shard - next_id) % SHARD_COUNT
+
+
+def fan_out(query: str, params: tuple = ()) -> List[sqlite3.Row]:
+    """Run a read query on every shard and concatenate the rows."""
+    rows: List[sqlite3.Row] = []
+    for shard in shard_ids():
+        conn = get_connection(shard)
+        rows.extend(conn.execute(query, params).fetchall())
+        conn.close()
+    return rows
+
+
+def sync_sequences(shards: Iterable[int]) -> None:
+    """
+    Raise the AUTOINCREMENT counters of preferences and orders in every
+    shard to the highest ID in any shard. IDs allocated afterwards are
+    above all existing ones and differ by shard, so they never collide.
+    """
+    shards = list(shards)
+    for table in ("preferences", "orders"):
+        highest = 0
+        for shard in shards:
+            conn = get_connection(shard)
+            row = conn.execute(f"SELECT MAX(id) FROM {table}").fetchone()
+            seq = conn.execute(
+                "SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)
+            ).fetchone()
+            conn.close()
+            highest = max(highest, row[0] or 0, seq[0] if seq else 0)
+        for shard in shards:
+            conn = get_connection(shard)
+            cursor = conn.execute(
+                "UPDATE sqlite_sequence SET seq = ? WHERE name = ? AND seq < ?",
+                (highest, table, highest),
+            )
+            if cursor.rowcount == 0:
+                conn.execute("""
+                    INSERT INTO sqlite_sequence (name, seq)
+                    SELECT ?, ? WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)
+                """, (table, highest, table))
+            conn.commit()
+            conn.close()
 
 
 def init_database():
     """
-    Initialize the database with required tables if they don't exist.
+    Initialize every shard with required tables if they don't exist.
     This function is called automatically on first import.
     """
-    conn = get_connection()
+    for shard in shard_ids():
+        conn = get_connection(shard)
+        create_schema(conn, seed_snacks=shard == 0)
+        conn.close()
+    if SHARD_COUNT > 1:
+        sync_sequences(shard_ids())
+
+
+# Built-in snacks: name, calories, proteins, fats, carbs, description, image
+DEFAULT_SNACKS = [
+    ("Грецький йогурт", 150, 10, 5, 16, "Натуральний грецький йогурт з ягодами", ""),
+    ("Змішані горіхи", 200, 6, 17, 7, "Мікс мигдалю, волоського горіха та кеш'ю", ""),
+    ("Фруктовий мікс", 120, 1, 0, 29, "Свіжі ягоди та фрукти", ""),
+    ("Хумус з морквою", 180, 6, 10, 17, "Хумус з паличками моркви", ""),
+    ("Протеїновий батончик", 250, 20, 8, 25, "Батончик з високим вмістом білка", ""),
+]
+
+
+def create_schema(conn: sqlite3.Connection, seed_snacks: bool = True) -> None:
+    """Create tables and indexes in one database file."""
     cursor = conn.cursor()
 
+    # Lets archive.py return freed pages with incremental vacuum
+    # (only takes effect for a newly created database file)
+    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
     # Table: preferences
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS preferences (
@@ -41,6 +253,12 @@ def init_database():
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     """)
+    # Generation settings added with the portion solver; macro_ratios is
+    # JSON of the normalized fractions, NULL for the default ratios
+    add_missing_columns(conn, "preferences", {
+        "macro_ratios": "TEXT",
+        "optimize_portions": "INTEGER NOT NULL DEFAULT 0",
+    })
 
     # Table: orders
     cursor.execute("""
@@ -70,6 +288,38 @@ def init_database():
         )
     """)
 
+    # Snack macros were added with the bulk catalog import
+    add_missing_columns(conn, "snacks", {
+        "proteins": "INTEGER NOT NULL DEFAULT 0",
+        "fats": "INTEGER NOT NULL DEFAULT 0",
+        "carbs": "INTEGER NOT NULL DEFAULT 0",
+    })
+    # Built-in snacks seeded before snacks had macros
+    cursor.executemany("""
+        UPDATE snacks SET proteins = ?, fats = ?, carbs = ?
+        WHERE name = ? AND proteins = 0 AND fats = 0 AND carbs = 0
+    """, [(proteins, fats, carbs, name) for name, _, proteins, fats, carbs, _, _ in DEFAULT_SNACKS])
+    # Imports upsert snacks by name
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_snacks_name ON snacks (name)")
+
+    # Table: meals - dishes imported with catalog_import.py, merged over the
+    # built-in catalog. Search terms are stored precomputed.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS meals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            meal_type TEXT NOT NULL,
+            calories INTEGER NOT NULL,
+            proteins INTEGER NOT NULL,
+            fats INTEGER NOT NULL,
+            carbs INTEGER NOT NULL,
+            ingredients_json TEXT NOT NULL,
+            tags_json TEXT NOT NULL,
+            search_terms_json TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
     # Table: menu_history - tracks daily menus to avoid repeats
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS menu_history (
@@ -87,23 +337,98 @@ def init_database():
         )
     """)
 
+    # Returning users are looked up by name on every plan request
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_preferences_user
+        ON preferences (user_name, created_at)
+    """)
+
+    # Keyset pagination of listings and exports, newest first
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_preferences_created
+        ON preferences (created_at, id)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_orders_created
+        ON orders (created_at, id)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_orders_status_created
+        ON orders (status, created_at, id)
+    """)
+
+    # Conversion rollups look up earlier orders of the same plan
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_orders_preference
+        ON orders (preference_id, id)
+    """)
+
+    # Tables: stats_buckets and stats_dishes - analytics rollups kept up to
+    # date by save_order/save_preferences (see analytics.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stats_buckets (
+            granularity TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            orders INTEGER NOT NULL DEFAULT 0,
+            order_calories INTEGER NOT NULL DEFAULT 0,
+            preferences INTEGER NOT NULL DEFAULT 0,
+            converted INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (granularity, bucket)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stats_dishes (
+            day TEXT NOT NULL,
+            name TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, name)
+        ) WITHOUT ROWID
+    """)
+
+    # Table: plan_flights - coordinates identical plan generations
+    # across worker processes (see singleflight.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS plan_flights (
+            key TEXT PRIMARY KEY,
+            state TEXT NOT NULL,
+            result_json TEXT,
+            updated_at REAL NOT NULL
+        )
+    """)
+
+    # Table: idempotency_keys - stored responses of POST requests sent
+    # with an Idempotency-Key header (see idempotency.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            endpoint TEXT NOT NULL,
+            key TEXT NOT NULL,
+            state TEXT NOT NULL,
+            status INTEGER,
+            content_type TEXT,
+            body BLOB,
+            fingerprint TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (endpoint, key)
+        ) WITHOUT ROWID
+    """)
+
     # Seed snacks if table is empty
     cursor.execute("SELECT COUNT(*) FROM snacks")
-    if cursor.fetchone()[0] == 0:
-        default_snacks = [
-            ("Грецький йогурт", 150, "Натуральний грецький йогурт з ягодами", ""),
-            ("Змішані горіхи", 200, "Мікс мигдалю, волоського горіха та кеш'ю", ""),
-            ("Фруктовий мікс", 120, "Свіжі ягоди та фрукти", ""),
-            ("Хумус з морквою", 180, "Хумус з паличками моркви", ""),
-            ("Протеїновий батончик", 250, "Батончик з високим вмістом білка", ""),
-        ]
+    if seed_snacks and cursor.fetchone()[0] == 0:
         cursor.executemany(
-            "INSERT INTO snacks (name, calories, description, image) VALUES (?, ?, ?, ?)",
-            default_snacks
+            f"INSERT INTO snacks ({SNACK_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            DEFAULT_SNACKS
         )
 
     conn.commit()
-    conn.close()
+
+
+def add_missing_columns(conn: sqlite3.Connection, table: str, columns: Dict[str, str]) -> None:
+    """Add columns (name -> SQL definition) that an older database file lacks."""
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for name, definition in columns.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
 
 
 def save_preferences(
@@ -115,14 +440,19 @@ def save_preferences(
     plan_type: str,
     menu: Dict[str, Any],
     total_calories: int,
+    macro_ratios: Optional[Dict[str, float]] = None,
+    optimize_portions: bool = False,
 ) -> int:
     """Save user preferences and return the record ID."""
-    conn = get_connection()
+    shard = shard_for_user(user_name)
+    conn = get_connection(shard)
     cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
     cursor.execute("""
-        INSERT INTO preferences (user_name, requested_calories, likes, dislikes, allergies, plan_type, menu_json, total_calories)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        INSERT INTO preferences (id, user_name, requested_calories, likes, dislikes, allergies, plan_type, menu_json, total_calories, macro_ratios, optimize_portions)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     """, (
+        _allocate_id(cursor, "preferences", shard),
         user_name,
         requested_calories,
         likes,
@@ -131,8 +461,11 @@ def save_preferences(
         plan_type,
         json.dumps(menu, ensure_ascii=False),
         total_calories,
+        json.dumps(macro_ratios) if macro_ratios is not None else None,
+        int(optimize_portions),
     ))
     record_id = cursor.lastrowid
+    record_rollups(cursor, "preferences", "p.id = ?", (record_id,))
     conn.commit()
     conn.close()
     return record_id
@@ -140,16 +473,15 @@ def save_preferences(
 
 def fetch_snacks() -> List[Dict[str, Any]]:
     """Fetch all snacks from the database."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name, calories, description, image FROM snacks")
-    rows = cursor.fetchall()
-    conn.close()
+    rows = fan_out("SELECT id, name, calories, proteins, fats, carbs, description, image FROM snacks")
     return [
         {
             "id": row["id"],
             "name": row["name"],
             "calories": row["calories"],
+            "proteins": row["proteins"],
+            "fats": row["fats"],
+            "carbs": row["carbs"],
             "description": row["description"] or "",
             "image": row["image"] or "",
         }
@@ -157,6 +489,49 @@ def fetch_snacks() -> List[Dict[str, Any]]:
     ]
 
 
+MEAL_COLUMNS = (
+    "name, meal_type, calories, proteins, fats, carbs, "
+    "ingredients_json, tags_json, search_terms_json"
+)
+SNACK_COLUMNS = "name, calories, proteins, fats, carbs, description, image"
+
+
+def fetch_meals() -> Iterator[sqlite3.Row]:
+    """Imported meals in import order (they live in shard 0)."""
+    conn = get_connection()
+    try:
+        yield from conn.execute(f"SELECT {MEAL_COLUMNS} FROM meals ORDER BY id")
+    finally:
+        conn.close()
+
+
+def _upsert(table: str, columns: str, rows: List[Tuple[Any, ...]]) -> None:
+    """Insert or update rows by name in one transaction on shard 0."""
+    names = [name.strip() for name in columns.split(",")]
+    updates = ", ".join(f"{name} = excluded.{name}" for name in names[1:])
+    if table == "meals":
+        updates += ", updated_at = CURRENT_TIMESTAMP"
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    cursor.executemany(f"""
+        INSERT INTO {table} ({columns}) VALUES ({", ".join("?" * len(names))})
+        ON CONFLICT (name) DO UPDATE SET {updates}
+    """, rows)
+    conn.commit()
+    conn.close()
+
+
+def upsert_meals(rows: List[Tuple[Any, ...]]) -> None:
+    """Upsert meals given as tuples in MEAL_COLUMNS order."""
+    _upsert("meals", MEAL_COLUMNS, rows)
+
+
+def upsert_snacks(rows: List[Tuple[Any, ...]]) -> None:
+    """Upsert snacks given as tuples in SNACK_COLUMNS order."""
+    _upsert("snacks", SNACK_COLUMNS, rows)
+
+
 def save_order(
     preference_id: Optional[int],
     user_name: str,
@@ -167,12 +542,15 @@ def save_order(
     total_calories: int,
 ) -> int:
     """Save an order and return the order ID."""
-    conn = get_connection()
+    shard = shard_for_user(user_name)
+    conn = get_connection(shard)
     cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
     cursor.execute("""
-        INSERT INTO orders (preference_id, user_name, phone, address, delivery_time, items_json, total_calories)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
+        INSERT INTO orders (id, preference_id, user_name, phone, address, delivery_time, items_json, total_calories)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
     """, (
+        _allocate_id(cursor, "orders", shard),
         preference_id,
         user_name,
         phone,
@@ -182,14 +560,236 @@ def save_order(
         total_calories,
     ))
     order_id = cursor.lastrowid
+    record_rollups(cursor, "orders", "o.id = ?", (order_id,))
     conn.commit()
     conn.close()
     return order_id
 
 
+# Rollup granularity -> strftime format of the bucket (times are UTC)
+STATS_GRANULARITIES = {
+    "minute": "%Y-%m-%d %H:%M",
+    "hour": "%Y-%m-%d %H:00",
+    "day": "%Y-%m-%d",
+}
+# Minute buckets are only kept for live views
+STATS_MINUTE_RETENTION = "-2 days"
+
+_GRANULARITY_CTE = "WITH g (granularity, format) AS (VALUES {})".format(
+    ", ".join(f"('{name}', '{fmt}')" for name, fmt in STATS_GRANULARITIES.items())
+)
+# Orders counted as conversions: the first order of a preferences record
+_FIRST_ORDER_OF_PLAN = """
+    NOT EXISTS (
+        SELECT 1 FROM orders earlier
+        WHERE earlier.preference_id = o.preference_id AND earlier.id < o.id
+    )
+"""
+
+_ITEM_NAME = "CASE WHEN item.type = 'object' THEN json_extract(item.value, '$.name') END"
+
+
+
+def record_rollups(cursor: sqlite3.Cursor, table: str, where: str, params: tuple = ()) -> None:
+    """
+    Add orders (alias o) or preferences (alias p) matching `where` to the
+    analytics rollups of the cursor's shard. Called with the new row inside
+    the transaction that saves it, and over whole tables by the backfill.
+    A conversion is counted in the bucket of the plan it converts, so
+    `converted` and `preferences` of a bucket describe the same plans.
+    """
+    if table == "orders":
+        cursor.execute(f"""
+            {_GRANULARITY_CTE}
+            INSERT INTO stats_buckets (granularity, bucket, orders, order_calories)
+            SELECT g.granularity, strftime(g.format, o.created_at), COUNT(*),
+                   SUM(COALESCE(o.total_calories, 0))
+            FROM orders o CROSS JOIN g
+            WHERE {where}
+            GROUP BY 1, 2
+            ON CONFLICT (granularity, bucket) DO UPDATE SET
+                orders = orders + excluded.orders,
+                order_calories = order_calories + excluded.order_calories
+        """, params)
+        cursor.execute(f"""
+            {_GRANULARITY_CTE}
+            INSERT INTO stats_buckets (granularity, bucket, converted)
+            SELECT g.granularity, strftime(g.format, p.created_at), COUNT(*)
+            FROM orders o JOIN preferences p ON p.id = o.preference_id CROSS JOIN g
+            WHERE ({where}) AND {_FIRST_ORDER_OF_PLAN}
+            GROUP BY 1, 2
+            ON CONFLICT (granularity, bucket) DO UPDATE SET
+                converted = converted + excluded.converted
+        """, params)
+        cursor.execute(f"""
+            INSERT INTO stats_dishes (day, name, count)
+            SELECT date(o.created_at), {_ITEM_NAME}, COUNT(*)
+            FROM orders o, json_each(CASE WHEN json_valid(o.items_json) THEN o.items_json END) item
+            WHERE {where} AND {_ITEM_NAME} IS NOT NULL
+            GROUP BY 1, 2
+            ON CONFLICT (day, name) DO UPDATE SET count = count + excluded.count
+        """, params)
+    else:
+        cursor.execute(f"""
+            {_GRANULARITY_CTE}
+            INSERT INTO stats_buckets (granularity, bucket, preferences)
+            SELECT g.granularity, strftime(g.format, p.created_at), COUNT(*)
+            FROM preferences p CROSS JOIN g
+            WHERE {where}
+            GROUP BY 1, 2
+            ON CONFLICT (granularity, bucket) DO UPDATE SET
+                preferences = preferences + excluded.preferences
+        """, params)
+    cursor.execute(
+        "DELETE FROM stats_buckets WHERE granularity = 'minute' AND bucket < strftime(?, 'now', ?)",
+        (STATS_GRANULARITIES["minute"], STATS_MINUTE_RETENTION),
+    )
+
+
+def order_from_row(row: sqlite3.Row) -> Dict[str, Any]:
+    """Convert an orders row into a dictionary."""
+    return {
+        "id": row["id"],
+        "preference_id": row["preference_id"],
+        "user_name": row["user_name"],
+        "phone": row["phone"],
+        "address": row["address"],
+        "delivery_time": row["delivery_time"] or "",
+        "items": json.loads(row["items_json"] or "[]"),
+        "total_calories": row["total_calories"],
+        "status": row["status"],
+        "created_at": row["created_at"],
+    }
+
+
+# Columns returned by listings, and the filters each listing accepts
+LISTING_COLUMNS = {
+    "orders": (
+        "id, preference_id, user_name, phone, address, delivery_time, "
+        "items_json, total_calories, status, created_at"
+    ),
+    "preferences": (
+        "id, user_name, requested_calories, likes, dislikes, allergies, "
+        "plan_type, total_calories, created_at"
+    ),
+}
+LISTING_FILTERS = {
+    "orders": ("status",),
+    "preferences": ("user_name", "plan_type"),
+}
+
+
+def _iter_shard_rows(
+    shard: int,
+    table: str,
+    where: List[str],
+    params: List[Any],
+    after: Optional[Tuple[str, int]],
+    chunk_size: int,
+) -> Iterator[sqlite3.Row]:
+    """Rows of one shard, newest first, fetched chunk by chunk by keyset."""
+    while True:
+        conditions = list(where)
+        chunk_params = list(params)
+        if after is not None:
+            conditions.append("(created_at, id) < (?, ?)")
+            chunk_params.extend(after)
+        query = f"SELECT {LISTING_COLUMNS[table]} FROM {table}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        chunk_params.append(chunk_size)
+
+        conn = get_connection(shard)
+        rows = conn.execute(query, chunk_params).fetchall()
+        conn.close()
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        after = (rows[-1]["created_at"], rows[-1]["id"])
+
+
+def iter_rows(
+    table: str,
+    filters: Optional[Dict[str, Any]] = None,
+    after: Optional[Tuple[str, int]] = None,
+    chunk_size: int = 500,
+) -> Iterator[sqlite3.Row]:
+    """
+    Iterate orders or preferences rows newest first across all shards,
+    starting after the (created_at, id) cursor. Supported filters are the
+    LISTING_FILTERS columns plus date_from/date_to (YYYY-MM-DD, inclusive).
+    At most chunk_size rows per shard are held in memory.
+    """
+    filters = filters or {}
+    where: List[str] = []
+    params: List[Any] = []
+    for column in LISTING_FILTERS[table]:
+        if filters.get(column):
+            where.append(f"{column} = ?")
+            params.append(filters[column])
+    if filters.get("date_from"):
+        where.append("created_at >= date(?)")
+        params.append(filters["date_from"])
+    if filters.get("date_to"):
+        where.append("created_at < date(?, '+1 day')")
+        params.append(filters["date_to"])
+
+    shard_rows = [
+        _iter_shard_rows(shard, table, where, params, after, chunk_size)
+        for shard in shard_ids()
+    ]
+    if len(shard_rows) == 1:
+        return shard_rows[0]
+    return heapq.merge(
+        *shard_rows, key=lambda row: (row["created_at"], row["id"]), reverse=True
+    )
+
+
+def preference_summary_from_row(row: sqlite3.Row) -> Dict[str, Any]:
+    """Convert a preferences listing row into a dictionary."""
+    return {
+        "id": row["id"],
+        "user_name": row["user_name"],
+        "requested_calories": row["requested_calories"],
+        "likes": row["likes"] or "",
+        "dislikes": row["dislikes"] or "",
+        "allergies": row["allergies"] or "",
+        "plan_type": row["plan_type"],
+        "total_calories": row["total_calories"],
+        "created_at": row["created_at"],
+    }
+
+
+PREFERENCE_COLUMNS = (
+    "id, user_name, requested_calories, likes, dislikes, allergies, plan_type, "
+    "macro_ratios, optimize_portions"
+)
+
+
+def preference_from_row(row: sqlite3.Row) -> Dict[str, Any]:
+    """
+    Generation profile of a preferences row. Archived rows may predate the
+    macro_ratios and optimize_portions columns.
+    """
+    columns = row.keys()
+    macro_ratios = row["macro_ratios"] if "macro_ratios" in columns else None
+    return {
+        "id": row["id"],
+        "user_name": row["user_name"],
+        "requested_calories": row["requested_calories"],
+        "likes": row["likes"] or "",
+        "dislikes": row["dislikes"] or "",
+        "allergies": row["allergies"] or "",
+        "plan_type": row["plan_type"],
+        "macro_ratios": json.loads(macro_ratios) if macro_ratios else None,
+        "optimize_portions": bool(row["optimize_portions"]) if "optimize_portions" in columns else False,
+    }
+
+
 def get_menu_history(preference_id: int, days_back: int = 10) -> List[Dict[str, Any]]:
     """Get menu history for a preference, returns last N days."""
-    conn = get_connection()
+    conn = get_connection(shard_for_record("preferences", preference_id))
     cursor = conn.cursor()
     cursor.execute("""
         SELECT day_number, menu_json, total_calories, total_proteins, total_fats, total_carbs
@@ -213,6 +813,73 @@ def get_menu_history(preference_id: int, days_back: int = 10) -> List[Dict[str,
     ]
 
 
+def get_latest_preference(user_name: str) -> Optional[Dict[str, Any]]:
+    """Get the most recent preferences record for a user, or None."""
+    conn = get_connection(shard_for_user(user_name))
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT {PREFERENCE_COLUMNS}
+        FROM preferences
+        WHERE user_name = ?
+        ORDER BY created_at DESC, id DESC
+        LIMIT 1
+    """, (user_name,))
+    row = cursor.fetchone()
+    conn.close()
+    return preference_from_row(row) if row is not None else None
+
+
+def get_preference(preference_id: int) -> Optional[Dict[str, Any]]:
+    """Get a preferences record by ID, or None."""
+    conn = get_connection(shard_for_record("preferences", preference_id))
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT {PREFERENCE_COLUMNS}
+        FROM preferences
+        WHERE id = ?
+    """, (preference_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return preference_from_row(row) if row is not None else None
+
+
+def update_plan_type(preference_id: int, plan_type: str) -> None:
+    """Change the plan type of an existing preferences record."""
+    conn = get_connection(shard_for_record("preferences", preference_id))
+    cursor = conn.cursor()
+    cursor.execute(
+        "UPDATE preferences SET plan_type = ? WHERE id = ?",
+        (plan_type, preference_id),
+    )
+    conn.commit()
+    conn.close()
+
+
+def get_plan_days(preference_id: int) -> List[Dict[str, Any]]:
+    """Get all stored days of a plan, ordered by day number."""
+    conn = get_connection(shard_for_record("preferences", preference_id))
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT day_number, menu_json, total_calories, total_proteins, total_fats, total_carbs
+        FROM menu_history
+        WHERE preference_id = ?
+        ORDER BY day_number
+    """, (preference_id,))
+    rows = cursor.fetchall()
+    conn.close()
+    return [
+        {
+            "day_number": row["day_number"],
+            "menu": json.loads(row["menu_json"]),
+            "total_calories": row["total_calories"],
+            "total_proteins": row["total_proteins"],
+            "total_fats": row["total_fats"],
+            "total_carbs": row["total_carbs"],
+        }
+        for row in rows
+    ]
+
+
 def save_menu_day(
     preference_id: int,
     day_number: int,
@@ -223,7 +890,7 @@ def save_menu_day(
     total_carbs: int,
 ) -> None:
     """Save a day's menu to history."""
-    conn = get_connection()
+    conn = get_connection(shard_for_record("preferences", preference_id))
     cursor = conn.cursor()
     cursor.execute("""
         INSERT OR REPLACE INTO menu_history 
@@ -242,9 +909,35 @@ def save_menu_day(
     conn.close()
 
 
+def save_menu_days(preference_id: int, days: List[Dict[str, Any]]) -> None:
+    """Save several days of a plan to history in a single transaction."""
+    if not days:
+        return
+    conn = get_connection(shard_for_record("preferences", preference_id))
+    cursor = conn.cursor()
+    cursor.executemany("""
+        INSERT OR REPLACE INTO menu_history
+        (preference_id, day_number, menu_json, total_calories, total_proteins, total_fats, total_carbs)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (
+            preference_id,
+            day_data["day"],
+            json.dumps(day_data["menu"], ensure_ascii=False),
+            day_data["total_calories"],
+            day_data["total_proteins"],
+            day_data["total_fats"],
+            day_data["total_carbs"],
+        )
+        for day_data in days
+    ])
+    conn.commit()
+    conn.close()
+
+
 def get_next_day_number(preference_id: int) -> int:
     """Get the next day number for a preference."""
-    conn = get_connection()
+    conn = get_connection(shard_for_record("preferences", preference_id))
     cursor = conn.cursor()
     cursor.execute("""
         SELECT MAX(day_number) as max_day
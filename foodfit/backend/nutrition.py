@@ -0,0 +1,194 @@
+"""
+Nutrition targets and the daily portion solver for FoodFit.
+Targets are derived from per-user macro ratios; the solver picks a portion
+size for every dish of a day and optionally adds snacks so the day's totals
+land close to the targets.
+"""
+
+import math
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from catalog import Meal
+
+# Share of calories per macro and calories per gram (БЖВ)
+DEFAULT_MACRO_RATIOS = {"proteins": 0.30, "fats": 0.30, "carbs": 0.40}
+CALORIES_PER_GRAM = {"proteins": 4, "fats": 9, "carbs": 4}
+
+PORTION_STEPS = (0.5, 0.75, 1.0, 1.25, 1.5, 1.75, 2.0)
+# Score penalty per 0.25 step away from a standard portion
+PORTION_PENALTY = 10
+MAX_SNACKS = 2
+# Calorie resolution of the DP state
+CALORIE_BUCKET = 10
+# Candidate entries the solver may evaluate per day. A fixed count instead
+# of a time limit keeps the result the same for the same input under any load
+DEFAULT_MAX_EXPANSIONS = 20000
+
+
+def parse_macro_ratios(value: Any) -> Optional[Dict[str, float]]:
+    """
+    Parse {"proteins": 30, "fats": 25, "carbs": 45} (percent or fractions)
+    into fractions that sum to 1. Returns None for missing or invalid input.
+    """
+    if not isinstance(value, dict):
+        return None
+    try:
+        ratios = {macro: float(value.get(macro, 0)) for macro in DEFAULT_MACRO_RATIOS}
+    except (ValueError, TypeError):
+        return None
+    if not all(math.isfinite(ratio) for ratio in ratios.values()):
+        return None
+    total = sum(ratios.values())
+    if total <= 0 or any(ratio < 0 for ratio in ratios.values()):
+        return None
+    return {macro: ratio / total for macro, ratio in ratios.items()}
+
+
+def calculate_target_macros(
+    target_calories: int,
+    ratios: Optional[Dict[str, float]] = None,
+) -> Dict[str, float]:
+    """
+    Calculate target БЖВ from the share of calories per macro.
+    Standard ratios are proteins 30%, fats 30%, carbs 40%.
+    """
+    ratios = ratios or DEFAULT_MACRO_RATIOS
+    return {
+        macro: round(target_calories * ratios[macro] / CALORIES_PER_GRAM[macro])
+        for macro in DEFAULT_MACRO_RATIOS
+    }
+
+
+def score_menu_deviation(
+    total_calories: int,
+    macros: Dict[str, int],
+    target_calories: int,
+    target_macros: Dict[str, float],
+) -> float:
+    """
+    Deviation of a day's totals from the targets (lower is better).
+    Calories are weighted twice as much as each macro.
+    """
+    calorie_diff = abs(total_calories - target_calories)
+    protein_diff = abs(macros["proteins"] - target_macros["proteins"])
+    fat_diff = abs(macros["fats"] - target_macros["fats"])
+    carb_diff = abs(macros["carbs"] - target_macros["carbs"])
+    return calorie_diff * 2 + protein_diff + fat_diff + carb_diff
+
+
+def portion_penalty(portion: float) -> float:
+    """Score penalty of a portion size away from the standard one."""
+    return abs(portion - 1.0) / 0.25 * PORTION_PENALTY
+
+
+# A DP entry: (calories, proteins, fats, carbs, penalty, choices)
+_Entry = Tuple[int, int, int, int, float, Tuple[Any, ...]]
+
+
+def _composition_gap(entry: _Entry, target_calories: int, target_macros: Dict[str, float]) -> float:
+    """
+    How far a partial day's macros are from the targets scaled down to its
+    calories. Used to keep one promising entry per calorie bucket.
+    """
+    calories, proteins, fats, carbs, penalty, _ = entry
+    share = calories / target_calories if target_calories else 0
+    return (
+        abs(proteins - target_macros["proteins"] * share)
+        + abs(fats - target_macros["fats"] * share)
+        + abs(carbs - target_macros["carbs"] * share)
+        + penalty
+    )
+
+
+def solve_day(
+    menu: Dict[str, Meal],
+    snacks: Sequence[Dict[str, Any]],
+    target_calories: int,
+    target_macros: Dict[str, float],
+    max_expansions: int = DEFAULT_MAX_EXPANSIONS,
+) -> Dict[str, Any]:
+    """
+    Choose a portion multiplier for every dish of the day and up to
+    MAX_SNACKS snacks so the totals minimize score_menu_deviation.
+
+    This is a multiple-choice knapsack solved by dynamic programming over
+    calorie buckets: every dish is a group with one option per portion
+    size, snacks are 0/1 items. Each (calorie bucket, snack count) state
+    keeps the entry whose macro composition is closest to the targets.
+    When max_expansions would be exceeded the remaining dishes keep a
+    standard portion and no more snacks are considered. Snacks without
+    known macros are skipped, since the day totals could not include them.
+    """
+    budget = max_expansions
+    # (calorie bucket, snack count) -> (composition gap, entry)
+    states: Dict[Tuple[int, int], Tuple[float, _Entry]] = {(0, 0): (0.0, (0, 0, 0, 0, 0.0, ()))}
+
+    def keep(new_states: Dict[Tuple[int, int], Tuple[float, _Entry]], key: Tuple[int, int], entry: _Entry) -> None:
+        gap = _composition_gap(entry, target_calories, target_macros)
+        current = new_states.get(key)
+        if current is None or gap < current[0]:
+            new_states[key] = (gap, entry)
+
+    for meal_type, meal in menu.items():
+        steps = PORTION_STEPS if len(states) * len(PORTION_STEPS) <= budget else (1.0,)
+        budget -= len(states) * len(steps)
+        new_states: Dict[Tuple[int, int], Tuple[float, _Entry]] = {}
+        for (_, snack_count), (_, entry) in states.items():
+            calories, proteins, fats, carbs, penalty, choices = entry
+            for portion in steps:
+                candidate = (
+                    calories + round(meal.calories * portion),
+                    proteins + round(meal.proteins * portion),
+                    fats + round(meal.fats * portion),
+                    carbs + round(meal.carbs * portion),
+                    penalty + portion_penalty(portion),
+                    choices + ((meal_type, portion),),
+                )
+                keep(new_states, (candidate[0] // CALORIE_BUCKET, snack_count), candidate)
+        states = new_states
+
+    for index, snack in enumerate(snacks):
+        if not any(snack.get(macro) for macro in CALORIES_PER_GRAM):
+            continue
+        if len(states) > budget:
+            break
+        budget -= len(states)
+        new_states = dict(states)
+        for (_, snack_count), (_, entry) in states.items():
+            if snack_count >= MAX_SNACKS:
+                continue
+            calories, proteins, fats, carbs, penalty, choices = entry
+            candidate = (
+                calories + int(snack.get("calories") or 0),
+                proteins + int(snack.get("proteins") or 0),
+                fats + int(snack.get("fats") or 0),
+                carbs + int(snack.get("carbs") or 0),
+                penalty,
+                choices + (("snack", index),),
+            )
+            keep(new_states, (candidate[0] // CALORIE_BUCKET, snack_count + 1), candidate)
+        states = new_states
+
+    def final_score(entry: _Entry) -> float:
+        calories, proteins, fats, carbs, penalty, _ = entry
+        macros = {"proteins": proteins, "fats": fats, "carbs": carbs}
+        return score_menu_deviation(calories, macros, target_calories, target_macros) + penalty
+
+    best = min((entry for _, entry in states.values()), key=final_score)
+    calories, proteins, fats, carbs, _, choices = best
+    portions = {meal_type: 1.0 for meal_type in menu}
+    chosen_snacks: List[Dict[str, Any]] = []
+    for kind, value in choices:
+        if kind == "snack":
+            chosen_snacks.append(snacks[value])
+        else:
+            portions[kind] = value
+
+    return {
+        "portions": portions,
+        "snacks": chosen_snacks,
+        "total_calories": calories,
+        "total_proteins": proteins,
+        "total_fats": fats,
+        "total_carbs": carbs,
+    }
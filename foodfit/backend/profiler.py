@@ -0,0 +1,232 @@
+"""
+SQL query profiling for FoodFit.
+When FOODFIT_PROFILE_SQL=1, every pooled SQLite connection counts executed
+statements with set_trace_callback and times cursor calls. Per request it
+flags repeated statement shapes (N+1 patterns such as one INSERT per plan
+day), and slow queries are kept in a ring buffer together with their
+EXPLAIN QUERY PLAN and appended to a JSON Lines log.
+
+Inspect a running worker through GET /api/debug/queries, or summarize the
+log from the command line:
+
+    python profiler.py --top 20
+"""
+
+import argparse
+import contextvars
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional
+
+ENABLED = os.environ.get("FOODFIT_PROFILE_SQL") == "1"
+SLOW_QUERY_MS = float(os.environ.get("FOODFIT_SLOW_QUERY_MS", "50"))
+SLOW_QUERY_LOG = Path(
+    os.environ.get("FOODFIT_SLOW_QUERY_LOG", Path(__file__).parent / "slow_queries.log")
+)
+# Same statement shape executed this many times in one request
+N_PLUS_ONE_THRESHOLD = 5
+RING_SIZE = 100
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize(sql: str) -> str:
+    """Statement shape with literals replaced by ? and whitespace collapsed."""
+    return _SPACES.sub(" ", _LITERALS.sub("?", sql)).strip()
+
+
+class RequestProfile:
+    """Statements executed while handling one request."""
+
+    __slots__ = ("endpoint", "statements", "calls", "query_time")
+
+    def __init__(self, endpoint: str) -> None:
+        self.endpoint = endpoint
+        # Every statement SQLite ran (executemany counts once per row)
+        self.statements: Counter = Counter()
+        # execute()/executemany() calls made by our code
+        self.calls: Counter = Counter()
+        self.query_time = 0.0
+
+    @property
+    def query_count(self) -> int:
+        return sum(self.statements.values())
+
+
+_current: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar(
+    "foodfit_sql_profile", default=None
+)
+_lock = threading.Lock()
+slow_queries: Deque[Dict[str, Any]] = deque(maxlen=RING_SIZE)
+n_plus_one: Deque[Dict[str, Any]] = deque(maxlen=RING_SIZE)
+# Normalized statement -> [count, total seconds, max seconds]
+statement_stats: Dict[str, List[float]] = {}
+
+
+def trace(statement: str) -> None:
+    """set_trace_callback hook: counts every statement, including COMMIT."""
+    profile = _current.get()
+    if profile is not None:
+        profile.statements[normalize(statement)] += 1
+
+
+def explain(conn: sqlite3.Connection, sql: str, params: Any) -> List[str]:
+    """EXPLAIN QUERY PLAN details of a statement, or [] if it has no plan."""
+    if not sql.lstrip().upper().startswith(("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")):
+        return []
+    # A plain cursor keeps the EXPLAIN out of the timed calls; the trace
+    # callback belongs to the whole connection, so it is switched off too.
+    # A pooled connection is used by one thread at a time
+    conn.set_trace_callback(None)
+    try:
+        cursor = sqlite3.Cursor(conn)
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        return [row[3] for row in cursor.fetchall()]
+    except sqlite3.Error:
+        return []
+    finally:
+        conn.set_trace_callback(trace)
+
+
+def record(conn: sqlite3.Connection, sql: str, params: Any, duration: float) -> None:
+    """Account a timed cursor call and keep it if it was slow."""
+    shape = normalize(sql)
+    profile = _current.get()
+    if profile is not None:
+        profile.calls[shape] += 1
+        profile.query_time += duration
+    with _lock:
+        stats = statement_stats.setdefault(shape, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += duration
+        stats[2] = max(stats[2], duration)
+
+    duration_ms = duration * 1000
+    if duration_ms < SLOW_QUERY_MS:
+        return
+    entry = {
+        "at": time.time(),
+        "endpoint": profile.endpoint if profile else None,
+        "sql": shape,
+        "duration_ms": round(duration_ms, 3),
+        "plan": explain(conn, sql, params),
+    }
+    with _lock:
+        slow_queries.append(entry)
+        with SLOW_QUERY_LOG.open("a", encoding="utf-8") as log:
+            log.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+class TracedCursor(sqlite3.Cursor):
+    """Cursor that times execute() and executemany()."""
+
+    def execute(self, sql: str, parameters: Any = ()) -> "TracedCursor":
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record(self.connection, sql, parameters, time.perf_counter() - started)
+
+    def executemany(self, sql: str, seq_of_parameters: Any) -> "TracedCursor":
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record(self.connection, sql, (), time.perf_counter() - started)
+
+
+def start_request(endpoint: str) -> contextvars.Token:
+    return _current.set(RequestProfile(endpoint))
+
+
+def finish_request(token: contextvars.Token) -> Optional[RequestProfile]:
+    """
+    End the current request profile and record N+1 patterns in it: the same
+    statement issued in a loop instead of one batched or joined query.
+    """
+    profile = _current.get()
+    _current.reset(token)
+    if profile is None:
+        return None
+    repeated = {
+        shape: count for shape, count in profile.calls.items()
+        if count >= N_PLUS_ONE_THRESHOLD
+    }
+    if repeated:
+        with _lock:
+            n_plus_one.append({
+                "at": time.time(),
+                "endpoint": profile.endpoint,
+                "query_count": profile.query_count,
+                "repeated": repeated,
+            })
+    return profile
+
+
+def snapshot(top: int = 20) -> Dict[str, Any]:
+    """Current profiling data of this process."""
+    with _lock:
+        ranked = sorted(statement_stats.items(), key=lambda item: item[1][1], reverse=True)
+        return {
+            "enabled": ENABLED,
+            "slow_query_ms": SLOW_QUERY_MS,
+            "top_statements": [
+                {
+                    "sql": shape,
+                    "count": int(count),
+                    "total_ms": round(total * 1000, 3),
+                    "max_ms": round(longest * 1000, 3),
+                }
+                for shape, (count, total, longest) in ranked[:top]
+            ],
+            "slow_queries": list(slow_queries),
+            "n_plus_one": list(n_plus_one),
+        }
+
+
+def report(log_path: Path = SLOW_QUERY_LOG, top: int = 20) -> str:
+    """Summarize the slow query log by statement shape, worst first."""
+    if not log_path.exists():
+        return f"No slow queries logged in {log_path}."
+    groups: Dict[str, Dict[str, Any]] = {}
+    with log_path.open(encoding="utf-8") as log:
+        for line in log:
+            entry = json.loads(line)
+            group = groups.setdefault(
+                entry["sql"], {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "plan": entry["plan"]}
+            )
+            group["count"] += 1
+            group["total_ms"] += entry["duration_ms"]
+            group["max_ms"] = max(group["max_ms"], entry["duration_ms"])
+
+    lines = []
+    ranked = sorted(groups.items(), key=lambda item: item[1]["total_ms"], reverse=True)
+    for shape, group in ranked[:top]:
+        full_scan = any(step.startswith("SCAN ") for step in group["plan"])
+        lines.append(
+            f"{group['count']:6d}x  total {group['total_ms']:9.1f} ms  "
+            f"max {group['max_ms']:8.1f} ms{'  FULL SCAN' if full_scan else ''}"
+        )
+        lines.append(f"    {shape}")
+        for step in group["plan"]:
+            lines.append(f"      {step}")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Summarize FoodFit slow SQL queries.")
+    parser.add_argument("--log", type=Path, default=SLOW_QUERY_LOG, help="slow query log file")
+    parser.add_argument("--top", type=int, default=20, help="number of statements to show")
+    args = parser.parse_args()
+    print(report(args.log, args.top))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Rebalance FoodFit user data after changing the number of shards.
+Every user's preferences, plan days and orders are moved to the shard given
+by models.shard_for_user for the new shard count. IDs are kept, so record
+IDs held by clients stay valid, and analytics rollups are rebuilt.
+
+Stop the service first, then run e.g.
+
+    python reshard.py --from 2 --to 4
+
+and start it again with FOODFIT_SHARDS=4.
+"""
+
+import argparse
+import sqlite3
+from collections import defaultdict
+from typing import Dict, List
+
+import analytics
+import models
+
+# Tables with per-user rows, in the order they are copied
+USER_TABLES = ("preferences", "menu_history", "orders")
+
+
+def _connect(shard: int) -> sqlite3.Connection:
+    conn = sqlite3.connect(str(models.shard_path(shard)))
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _columns(cursor: sqlite3.Cursor, table: str, include_id: bool = True) -> str:
+    cursor.execute(f"PRAGMA main.table_info({table})")
+    return ", ".join(
+        row[1] for row in cursor.fetchall() if include_id or row[1] != "id"
+    )
+
+
+def _move_users(conn: sqlite3.Connection, target: int, user_names: List[str]) -> Dict[str, int]:
+    """Move all rows of the given users from conn's shard into the target shard."""
+    cursor = conn.cursor()
+    cursor.execute("DROP TABLE IF EXISTS temp.moving_users")
+    cursor.execute("CREATE TEMP TABLE moving_users (user_name TEXT PRIMARY KEY)")
+    cursor.executemany(
+        "INSERT INTO temp.moving_users (user_name) VALUES (?)",
+        [(name,) for name in user_names],
+    )
+    selections = {
+        "preferences": "user_name IN (SELECT user_name FROM temp.moving_users)",
+        "menu_history": """preference_id IN (
+            SELECT id FROM main.preferences
+            WHERE user_name IN (SELECT user_name FROM temp.moving_users)
+        )""",
+        "orders": "user_name IN (SELECT user_name FROM temp.moving_users)",
+    }
+
+    conn.commit()
+    cursor.execute("ATTACH DATABASE ? AS target", (str(models.shard_path(target)),))
+    moved = {}
+    try:
+        for table in USER_TABLES:
+            # menu_history IDs are local to a shard and never referenced
+            columns = _columns(cursor, table, include_id=table != "menu_history")
+            cursor.execute(
+                f"INSERT OR REPLACE INTO target.{table} ({columns}) "
+                f"SELECT {columns} FROM main.{table} WHERE {selections[table]}"
+            )
+            moved[table] = cursor.rowcount
+        # Delete plan days before the preferences they are selected by
+        for table in reversed(USER_TABLES):
+            cursor.execute(f"DELETE FROM main.{table} WHERE {selections[table]}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.execute("DETACH DATABASE target")
+    return moved
+
+
+def reshard(old_count: int, new_count: int) -> Dict[str, int]:
+    """Move user rows from old_count shards into new_count shards."""
+    models.close_pools()
+    for shard in range(new_count):
+        conn = _connect(shard)
+        models.create_schema(conn, seed_snacks=shard == 0)
+        conn.close()
+
+    totals = {"users": 0, **{table: 0 for table in USER_TABLES}}
+    for source in range(max(old_count, new_count)):
+        if not models.shard_path(source).exists():
+            continue
+        conn = _connect(source)
+        rows = conn.execute(
+            "SELECT user_name FROM preferences UNION SELECT user_name FROM orders"
+        ).fetchall()
+
+        by_target: Dict[int, List[str]] = defaultdict(list)
+        for row in rows:
+            target = models.stable_hash(row["user_name"]) % new_count
+            if target != source:
+                by_target[target].append(row["user_name"])
+
+        for target, user_names in by_target.items():
+            totals["users"] += len(user_names)
+            for table, count in _move_users(conn, target, user_names).items():
+                totals[table] += count
+        conn.close()
+
+    models.sync_sequences(range(new_count))
+    # Rollups follow the moved orders and preferences
+    analytics.backfill(range(new_count))
+    return totals
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebalance FoodFit shards.")
+    parser.add_argument("--from", dest="old_count", type=int, required=True,
+                        help="current number of shards")
+    parser.add_argument("--to", dest="new_count", type=int, required=True,
+                        help="new number of shards")
+    args = parser.parse_args()
+    if args.new_count < 1:
+        parser.error("--to must be at least 1")
+
+    totals = reshard(args.old_count, args.new_count)
+    for name, count in totals.items():
+        print(f"{name}: {count}")
+    if args.new_count < args.old_count:
+        print("Shards above the new count are now empty and can be removed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+Memory-mapped meal catalog shared by all worker processes.
+The compiled catalog (built-in DEFAULT_MEALS merged with imported meals) is
+written once into a read-only file of flat int arrays plus a string table.
+Every worker maps that file, so the catalog lives once in the page cache
+instead of once per worker as Python objects, and lookups read the arrays in
+place; Meal tuples are only built for the dishes a request actually returns.
+
+Gunicorn compiles the file in the master before forking (gunicorn.conf.py);
+other servers compile it on first import when it is missing or stale.
+catalog_import.py rebuilds it after an import and atomically swaps it in,
+and workers switch to the new file within RELOAD_INTERVAL seconds.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from functools import lru_cache, wraps
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import catalog
+import models
+from catalog import Meal
+
+CATALOG_PATH = Path(
+    os.environ.get("FOODFIT_CATALOG_PATH", Path(__file__).parent / "catalog.bin")
+)
+RELOAD_INTERVAL = 1.0
+# Materialized Meal tuples kept per worker
+MEAL_CACHE_SIZE = 4096
+# Meal ids kept by all cached per-profile selections of a worker (4 bytes
+# each), so the caches stay the same size however large the catalog grows
+SELECTION_CACHE_IDS = 1 << 20
+
+MAGIC = b"FFCAT\x00\x00\x01"
+# magic, source fingerprint, meal count, meal type count, string count,
+# list entry count, string table size
+HEADER = struct.Struct("=8s32sIIIII")
+# Per meal: name, search haystack, calories, proteins, fats, carbs,
+# first ingredient, ingredient count, first tag, tag count
+MEAL_FIELDS = 10
+# Search terms are joined with NUL so one substring test covers all of them
+TERM_SEPARATOR = "\x00"
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def source_library() -> Dict[str, Tuple[Meal, ...]]:
+    """Built-in meals with meals imported by catalog_import.py merged in."""
+    return catalog.merge_library(
+        catalog.build_library(catalog.DEFAULT_MEALS),
+        ((row["meal_type"], Meal.from_row(row)) for row in models.fetch_meals()),
+    )
+
+
+def source_fingerprint() -> bytes:
+    """Changes whenever the built-in or imported meals change."""
+    conn = models.get_connection()
+    imported = tuple(conn.execute("SELECT COUNT(*), MAX(id), MAX(updated_at) FROM meals").fetchone())
+    conn.close()
+    source = json.dumps([MAGIC.hex(), catalog.DEFAULT_MEALS, imported], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(source.encode("utf-8")).digest()
+
+
+def compile_catalog(
+    library: Dict[str, Tuple[Meal, ...]], path: Path = CATALOG_PATH, fingerprint: bytes = b""
+) -> None:
+    """Write the catalog file next to `path` and atomically replace it."""
+    string_ids: Dict[str, int] = {}
+    blob = bytearray()
+    string_offsets = array("I", [0])
+
+    def string_id(text: str) -> int:
+        sid = string_ids.get(text)
+        if sid is None:
+            sid = string_ids[text] = len(string_offsets) - 1
+            blob.extend(text.encode("utf-8"))
+            string_offsets.append(len(blob))
+        return sid
+
+    types = array("I")
+    meals = array("i")
+    lists = array("I")
+    names: List[Tuple[bytes, int]] = []
+    for meal_type, type_meals in library.items():
+        types.extend((string_id(meal_type), len(names), len(type_meals)))
+        for meal in type_meals:
+            names.append((meal.name.encode("utf-8"), len(names)))
+            meals.extend((
+                string_id(meal.name),
+                string_id(TERM_SEPARATOR.join(meal.search_terms)),
+                meal.calories, meal.proteins, meal.fats, meal.carbs,
+                len(lists), len(meal.ingredients),
+                len(lists) + len(meal.ingredients), len(meal.tags),
+            ))
+            lists.extend(string_id(item) for item in meal.ingredients + meal.tags)
+    name_order = array("I", (meal_id for _, meal_id in sorted(names)))
+
+    temporary = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with temporary.open("wb") as target:
+        target.write(HEADER.pack(
+            MAGIC, fingerprint.ljust(32, b"\x00"), len(names), len(types) // 3,
+            len(string_offsets) - 1, len(lists), len(blob),
+        ))
+        for section in (types, meals, name_order, lists, string_offsets):
+            target.write(b"\x00" * (_align(target.tell()) - target.tell()))
+            section.tofile(target)
+        target.write(b"\x00" * (_align(target.tell()) - target.tell()))
+        target.write(blob)
+        target.flush()
+        os.fsync(target.fileno())
+    os.replace(temporary, path)
+
+
+class MappedCatalog:
+    """Read-only view of a compiled catalog file."""
+
+    def __init__(self, path: Path = CATALOG_PATH) -> None:
+        with path.open("rb") as source:
+            self._map = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+            self.stat = os.fstat(source.fileno())
+        view = memoryview(self._map)
+        magic, fingerprint, meal_count, type_count, string_count, list_count, blob_size = (
+            HEADER.unpack_from(view)
+        )
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a compiled FoodFit catalog")
+        self.fingerprint = fingerprint
+
+        offset = HEADER.size
+
+        def section(count: int, fmt: str) -> memoryview:
+            nonlocal offset
+            offset = _align(offset)
+            data = view[offset:offset + 4 * count].cast(fmt)
+            offset += 4 * count
+            return data
+
+        types = section(3 * type_count, "I")
+        self._meals = section(MEAL_FIELDS * meal_count, "i")
+        self._name_order = section(meal_count, "I")
+        self._lists = section(list_count, "I")
+        self._string_offsets = section(string_count + 1, "I")
+        self._blob_start = _align(offset)
+        # Strided zero-copy views of calories, proteins, fats and carbs by meal id
+        self.calories, self.proteins, self.fats, self.carbs = (
+            self._meals[field::MEAL_FIELDS] for field in range(2, 6)
+        )
+        self._types = {
+            self.string(types[i]): range(types[i + 1], types[i + 1] + types[i + 2])
+            for i in range(0, len(types), 3)
+        }
+        self.meal = lru_cache(maxsize=MEAL_CACHE_SIZE)(self._build_meal)
+
+    def _string_bytes(self, sid: int) -> bytes:
+        start = self._blob_start + self._string_offsets[sid]
+        return self._map[start:self._blob_start + self._string_offsets[sid + 1]]
+
+    def string(self, sid: int) -> str:
+        return self._string_bytes(sid).decode("utf-8")
+
+    def ids(self, meal_type: str) -> range:
+        """Meal ids of a meal type, in catalog order."""
+        return self._types.get(meal_type, range(0))
+
+    def name(self, meal_id: int) -> str:
+        return self.string(self._meals[meal_id * MEAL_FIELDS])
+
+    def haystack(self, meal_id: int) -> bytes:
+        """UTF-8 search terms joined by NUL: `term in haystack` matches like Meal.search_terms."""
+        return self._string_bytes(self._meals[meal_id * MEAL_FIELDS + 1])
+
+    def find(self, name: str) -> Optional[int]:
+        """Id of the meal with this name, by binary search over the name index."""
+        target = name.encode("utf-8")
+        low, high = 0, len(self._name_order)
+        while low < high:
+            middle = (low + high) // 2
+            meal_id = self._name_order[middle]
+            if self._string_bytes(self._meals[meal_id * MEAL_FIELDS]) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self._name_order):
+            meal_id = self._name_order[low]
+            if self.name(meal_id) == name:
+                return meal_id
+        return None
+
+    def _build_meal(self, meal_id: int) -> Meal:
+        record = self._meals[meal_id * MEAL_FIELDS:(meal_id + 1) * MEAL_FIELDS]
+        name, haystack, calories, proteins, fats, carbs, first, count, first_tag, tag_count = record
+        return Meal(
+            name=self.string(name),
+            calories=calories,
+            proteins=proteins,
+            fats=fats,
+            carbs=carbs,
+            ingredients=tuple(self.string(sid) for sid in self._lists[first:first + count]),
+            tags=tuple(self.string(sid) for sid in self._lists[first_tag:first_tag + tag_count]),
+            search_terms=tuple(self.string(haystack).split(TERM_SEPARATOR)),
+        )
+
+
+class IdCache:
+    """
+    LRU cache of meal id arrays bounded by the total number of ids held
+    instead of the number of entries. A selection larger than the whole
+    budget is returned without being cached.
+    """
+
+    def __init__(self, max_ids: int = SELECTION_CACHE_IDS) -> None:
+        self.max_ids = max_ids
+        self.size = 0
+        self._entries: "OrderedDict[Tuple[Any, ...], array]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, function: Callable[..., array]) -> Callable[..., array]:
+        """Memoize a function of hashable arguments that returns an id array."""
+        @wraps(function)
+        def wrapper(*args: Any) -> array:
+            key = (function.__name__, *args)
+            with self._lock:
+                ids = self._entries.get(key)
+                if ids is not None:
+                    self._entries.move_to_end(key)
+                    return ids
+            ids = function(*args)
+            if len(ids) <= self.max_ids:
+                with self._lock:
+                    if key not in self._entries:
+                        self._entries[key] = ids
+                        self.size += len(ids)
+                        while self.size > self.max_ids:
+                            _, evicted = self._entries.popitem(last=False)
+                            self.size -= len(evicted)
+            return ids
+
+        return wrapper
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+def ensure_compiled(path: Path = CATALOG_PATH) -> None:
+    """Compile the catalog unless the file already matches the sources."""
+    fingerprint = source_fingerprint()
+    try:
+        if MappedCatalog(path).fingerprint == fingerprint:
+            return
+    except (OSError, ValueError):
+        pass
+    compile_catalog(source_library(), path, fingerprint)
+
+
+def rebuild(path: Path = CATALOG_PATH) -> None:
+    """Recompile after the sources changed; running workers pick it up."""
+    compile_catalog(source_library(), path, source_fingerprint())
+
+
+_lock = threading.Lock()
+_current: Optional[MappedCatalog] = None
+_checked_at = 0.0
+_swap_callbacks: List[Callable[[], None]] = []
+
+
+def on_swap(callback: Callable[[], None]) -> Callable[[], None]:
+    """Register a function called after the worker switched to a new catalog."""
+    _swap_callbacks.append(callback)
+    return callback
+
+
+def current(path: Path = CATALOG_PATH) -> MappedCatalog:
+    """The mapped catalog, remapped when the file was swapped."""
+    global _current, _checked_at
+    now = time.monotonic()
+    if _current is not None and now - _checked_at < RELOAD_INTERVAL:
+        return _current
+    with _lock:
+        if _current is None:
+            ensure_compiled(path)
+            _current = MappedCatalog(path)
+        elif now - _checked_at >= RELOAD_INTERVAL:
+            stat = os.stat(path)
+            if (stat.st_ino, stat.st_mtime_ns) != (_current.stat.st_ino, _current.stat.st_mtime_ns):
+                # The old mapping stays valid for requests still using it
+                _current = MappedCatalog(path)
+                for callback in _swap_callbacks:
+                    callback()
+        _checked_at = now
+        return _current
@@ -0,0 +1,155 @@
+"""
+Request coalescing for FoodFit plan generation.
+Concurrent calls with the same key run the computation once and share its
+result: threads of one worker wait on an in-process flight. With
+FOODFIT_SHARED_FLIGHTS=1 other worker processes also wait on a row in the
+plan_flights table of database.db.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import models
+
+# Deduplicate across worker processes through SQLite. Opt-in: every
+# computation then takes two write transactions on database.db (shard 0)
+# and stores its result there, which serializes plan requests of all shards
+SHARED_FLIGHTS = os.environ.get("FOODFIT_SHARED_FLIGHTS", "0") == "1"
+# How long a finished result is still handed to late arrivals (seconds)
+RESULT_TTL = 5.0
+# A running flight older than this is assumed dead and taken over
+FLIGHT_TIMEOUT = 30.0
+POLL_INTERVAL = 0.02
+
+
+def make_key(inputs: Dict[str, Any]) -> str:
+    """Stable key for JSON-serializable inputs."""
+    encoded = json.dumps(inputs, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class FlightGroup:
+    """Runs at most one computation per key at a time within a process."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+
+    def do(self, key: str, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = compute()
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+
+def _claim(key: str) -> Optional[Any]:
+    """
+    Try to become the process computing `key`. Returns None when claimed,
+    otherwise waits for the owning process and returns its decoded result.
+    """
+    while True:
+        now = time.time()
+        conn = models.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT state, result_json, updated_at FROM plan_flights WHERE key = ?", (key,)
+        )
+        row = cursor.fetchone()
+        if row is not None and row["state"] == "done" and row["updated_at"] >= now - RESULT_TTL:
+            conn.close()
+            return json.loads(row["result_json"])
+        if row is not None and row["state"] == "running" and row["updated_at"] >= now - FLIGHT_TIMEOUT:
+            conn.close()
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        # No usable row: sweep expired flights and claim this key
+        cursor.execute("""
+            DELETE FROM plan_flights
+            WHERE (state = 'done' AND updated_at < ?) OR (state = 'running' AND updated_at < ?)
+        """, (now - RESULT_TTL, now - FLIGHT_TIMEOUT))
+        cursor.execute("""
+            INSERT OR IGNORE INTO plan_flights (key, state, updated_at)
+            VALUES (?, 'running', ?)
+        """, (key, now))
+        claimed = cursor.rowcount == 1
+        conn.commit()
+        conn.close()
+        if claimed:
+            return None
+
+
+def _publish(key: str, result: Any) -> None:
+    conn = models.get_connection()
+    conn.execute("""
+        UPDATE plan_flights SET state = 'done', result_json = ?, updated_at = ?
+        WHERE key = ?
+    """, (json.dumps(result, ensure_ascii=False), time.time(), key))
+    conn.commit()
+    conn.close()
+
+
+def _abandon(key: str) -> None:
+    conn = models.get_connection()
+    conn.execute("DELETE FROM plan_flights WHERE key = ? AND state = 'running'", (key,))
+    conn.commit()
+    conn.close()
+
+
+def shared_compute(key: str, compute: Callable[[], Any]) -> Any:
+    """
+    Run compute() unless another worker process is already computing the
+    same key, in which case wait for and return its result. The result must
+    be JSON-serializable.
+    """
+    if not SHARED_FLIGHTS:
+        return compute()
+    shared = _claim(key)
+    if shared is not None:
+        return shared
+    try:
+        result = compute()
+    except BaseException:
+        _abandon(key)
+        raise
+    _publish(key, result)
+    return result
+
+
+_local_flights = FlightGroup()
+
+
+def coalesce(key: str, compute: Callable[[], Any]) -> Any:
+    """Share one computation between identical concurrent calls in all workers."""
+    return _local_flights.do(key, lambda: shared_compute(key, compute))
@@ -0,0 +1,141 @@
+"""
+Static frontend pipeline for FoodFit.
+At startup every file of foodfit/frontend is loaded into memory, given a
+content-hashed name (style.css -> style.3f9a1c2b7d.css) and precompressed
+with gzip and, when the optional brotli package is installed, brotli.
+HTML pages are rewritten to reference the hashed names, so hashed assets can
+be cached forever while pages are revalidated with ETags.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import re
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional
+
+from flask import Flask, Response, abort, request
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+FRONTEND_DIR = Path(__file__).parent.parent / "frontend"
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+# Attribute references rewritten to hashed names inside HTML pages
+REFERENCE_PATTERN = re.compile(r'((?:href|src)=")([^"#?:]+)(")')
+
+
+class Asset(NamedTuple):
+    body: bytes
+    content_type: str
+    etag: str
+    cache_control: str
+    # Content-Encoding -> precompressed body
+    encoded: Dict[str, bytes]
+
+
+def _content_hash(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()[:10]
+
+
+def _hashed_name(relative: str, digest: str) -> str:
+    path = Path(relative)
+    return str(path.with_name(f"{path.stem}.{digest}{path.suffix}"))
+
+
+def _compress(body: bytes, content_type: str) -> Dict[str, bytes]:
+    """Precompressed variants that are actually smaller than the original."""
+    if not content_type.startswith(COMPRESSIBLE_TYPES):
+        return {}
+    variants = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(body)
+    return {encoding: data for encoding, data in variants.items() if len(data) < len(body)}
+
+
+def _make_asset(body: bytes, relative: str, cache_control: str) -> Asset:
+    content_type = mimetypes.guess_type(relative)[0] or "application/octet-stream"
+    if content_type.startswith("text/") or content_type == "application/javascript":
+        content_type += "; charset=utf-8"
+    return Asset(body, content_type, _content_hash(body), cache_control, _compress(body, content_type))
+
+
+def build_assets(frontend_dir: Path = FRONTEND_DIR) -> Dict[str, Asset]:
+    """
+    Load and precompress the frontend. Returns URL path -> Asset with both
+    the hashed name (immutable) and the original name (revalidated) of every
+    non-HTML file, plus the rewritten HTML pages.
+    """
+    assets: Dict[str, Asset] = {}
+    hashed_names: Dict[str, str] = {}
+    pages = []
+    for path in sorted(frontend_dir.rglob("*")):
+        if not path.is_file():
+            continue
+        relative = path.relative_to(frontend_dir).as_posix()
+        if path.suffix == ".html":
+            pages.append((relative, path))
+            continue
+        body = path.read_bytes()
+        hashed = _hashed_name(relative, _content_hash(body))
+        hashed_names[relative] = hashed
+        assets[hashed] = _make_asset(body, relative, IMMUTABLE)
+        assets[relative] = _make_asset(body, relative, REVALIDATE)
+
+    for relative, path in pages:
+        base = Path(relative).parent
+
+        def rewrite(match: "re.Match[str]") -> str:
+            target = (base / match.group(2)).as_posix()
+            hashed = hashed_names.get(target)
+            if hashed is None:
+                return match.group(0)
+            return match.group(1) + Path(hashed).relative_to(base).as_posix() + match.group(3)
+
+        html = REFERENCE_PATTERN.sub(rewrite, path.read_text(encoding="utf-8"))
+        assets[relative] = _make_asset(html.encode("utf-8"), relative, REVALIDATE)
+    return assets
+
+
+def _negotiate(asset: Asset) -> Optional[str]:
+    """Pick the best precompressed variant the client accepts."""
+    if request.range is not None:
+        # Byte ranges always refer to the identity representation
+        return None
+    accepted = request.accept_encodings
+    for encoding in ("br", "gzip"):
+        if encoding in asset.encoded and accepted[encoding] > 0:
+            return encoding
+    return None
+
+
+def asset_response(asset: Asset) -> Response:
+    """Response for an asset with compression, ETag/304 and Range support."""
+    encoding = _negotiate(asset)
+    body = asset.encoded[encoding] if encoding else asset.body
+    response = Response(body, content_type=asset.content_type)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Cache-Control"] = asset.cache_control
+    response.vary.add("Accept-Encoding")
+    response.set_etag(f"{asset.etag}-{encoding}" if encoding else asset.etag)
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(body))
+
+
+def register(app: Flask, frontend_dir: Path = FRONTEND_DIR) -> None:
+    """Serve the frontend from `app`; / stays the API health check."""
+    if not frontend_dir.is_dir():
+        return
+    assets = build_assets(frontend_dir)
+
+    @app.get("/<path:filename>")
+    def frontend_asset(filename: str) -> Response:
+        asset = assets.get(filename)
+        if asset is None:
+            abort(404)
+        return asset_response(asset)
@@ -35,6 +35,25 @@ function readFromStorage(key) {
     }
 }
 
+// Idempotency keys by endpoint: a resubmission of the same body (double click,
+// retry after a network error) reuses the key, so the backend does not repeat it
+const idempotencyKeys = {};
+
+/**
+ * Get the Idempotency-Key for a request body
+ */
+function idempotencyKeyFor(endpoint, body) {
+    const previous = idempotencyKeys[endpoint];
+    if (previous && previous.body === body) {
+        return previous.key;
+    }
+    const key = window.crypto && crypto.randomUUID
+        ? crypto.randomUUID()
+        : `${Date.now()}-${Math.random().toString(16).slice(2)}`;
+    idempotencyKeys[endpoint] = { body, key };
+    return key;
+}
+
 /**
  * Initialize plans page - save plan type from URL
  */
@@ -80,10 +99,14 @@ function initPreferencesPage() {
         };
 
         try {
+            const body = JSON.stringify(payload);
             const response = await fetch(`${API_BASE_URL}/api/preferences`, {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify(payload),
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Idempotency-Key': idempotencyKeyFor('preferences', body),
+                },
+                body,
             });
 
             const data = await response.json();
@@ -350,10 +373,14 @@ function initMenuPage() {
             };
 
             try {
+                const body = JSON.stringify(payload);
                 const response = await fetch(`${API_BASE_URL}/api/order`, {
                     method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify(payload),
+                    headers: {
+                        'Content-Type': 'application/json',
+                        'Idempotency-Key': idempotencyKeyFor('order', body),
+                    },
+                    body,
                 });
                 const data = await response.json();
                 if (!response.ok) {
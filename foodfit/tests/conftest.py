@@ -0,0 +1,18 @@
+"""
+Test setup: backend modules are imported as flat modules (like the app
+does) and work on throwaway database files split over three shards.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent / "backend"
+DATA_DIR = Path(tempfile.mkdtemp(prefix="foodfit-tests-"))
+
+# models reads these on import
+os.environ["FOODFIT_DB_PATH"] = str(DATA_DIR / "database.db")
+os.environ["FOODFIT_CATALOG_PATH"] = str(DATA_DIR / "catalog.bin")
+os.environ["FOODFIT_SHARDS"] = "3"
+sys.path.insert(0, str(BACKEND))
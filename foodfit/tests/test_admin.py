@@ -0,0 +1,31 @@
+import pytest
+
+import app as foodfit
+
+LOCAL = {"REMOTE_ADDR": "127.0.0.1"}
+
+
+@pytest.fixture
+def client():
+    return foodfit.app.test_client()
+
+
+def test_listings_are_closed_without_a_token(client, monkeypatch):
+    monkeypatch.setattr(foodfit, "ADMIN_TOKEN", "")
+    monkeypatch.setattr(foodfit, "ADMIN_ALLOW_LOCAL", False)
+    assert client.get("/api/orders", environ_base=LOCAL).status_code == 403
+
+
+def test_local_requests_need_an_explicit_opt_in(client, monkeypatch):
+    monkeypatch.setattr(foodfit, "ADMIN_TOKEN", "")
+    monkeypatch.setattr(foodfit, "ADMIN_ALLOW_LOCAL", True)
+    assert client.get("/api/orders", environ_base=LOCAL).status_code == 200
+    assert client.get("/api/orders", environ_base={"REMOTE_ADDR": "10.0.0.5"}).status_code == 403
+
+
+def test_token_is_required_when_configured(client, monkeypatch):
+    monkeypatch.setattr(foodfit, "ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(foodfit, "ADMIN_ALLOW_LOCAL", True)
+    assert client.get("/api/orders", environ_base=LOCAL).status_code == 403
+    response = client.get("/api/orders", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
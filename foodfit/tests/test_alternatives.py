@@ -0,0 +1,20 @@
+import app
+
+
+def test_meals_of_later_days_count_as_recently_used():
+    client = app.app.test_client()
+    plan = client.post("/api/preferences", json={
+        "user_name": "alternatives", "calories": 2200, "plan_type": "weekly",
+    }).get_json()
+    lunches = {day["day"]: day["menu"]["lunch"]["name"] for day in plan["days"]}
+
+    response = client.get(
+        f"/api/plans/{plan['record_id']}/day/3/alternatives?meal=lunch&k=20"
+    )
+    assert response.status_code == 200
+    alternatives = response.get_json()["alternatives"]
+    later = {lunches[day] for day in range(4, 8)} - {lunches[3]}
+    assert later
+    for alternative in alternatives:
+        if alternative["name"] in later:
+            assert alternative["recently_used"]
@@ -0,0 +1,41 @@
+from datetime import datetime, timezone
+
+import analytics
+import models
+
+
+def test_date_only_to_covers_the_whole_day():
+    models.save_order(None, "Аналітика", "+380671112233", "Київ", "18:30", [{"name": "Омлет"}], 320)
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+    by_hour = analytics.query_stats("hour", since=today, until=today)
+    by_day = analytics.query_stats("day", since=today, until=today)
+
+    assert by_hour["to"] == f"{today} 23:00"
+    assert by_hour["totals"]["orders"] == by_day["totals"]["orders"] >= 1
+
+
+def test_offsets_are_converted_to_utc():
+    stats = analytics.query_stats("hour", since="2025-03-01T10:00+02:00", until="2025-03-01T23:30Z")
+    assert (stats["from"], stats["to"]) == ("2025-03-01 08:00", "2025-03-01 23:00")
+
+
+def test_conversions_count_in_the_bucket_of_their_plan():
+    preference_id = models.save_preferences("Конверсія", 2000, "", "", "", "weekly", {}, 2000)
+    conn = models.get_connection(models.shard_for_record("preferences", preference_id))
+    conn.execute(
+        "UPDATE preferences SET created_at = '2020-02-01 10:00:00' WHERE id = ?", (preference_id,)
+    )
+    conn.commit()
+    conn.close()
+    analytics.backfill()
+
+    for _ in range(2):
+        models.save_order(preference_id, "Конверсія", "+380671112233", "Київ", "18:30", [], 0)
+
+    plan_day = analytics.query_stats("day", since="2020-02-01", until="2020-02-01")["totals"]
+    assert (plan_day["preferences"], plan_day["orders"], plan_day["converted"]) == (1, 0, 1)
+    assert plan_day["conversion_rate"] == 1.0
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    order_day = analytics.query_stats("day", since=today, until=today)["totals"]
+    assert order_day["converted"] <= order_day["preferences"]
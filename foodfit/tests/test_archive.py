@@ -0,0 +1,95 @@
+import sqlite3
+
+import pytest
+
+import archive
+import models
+
+OLD_TIMESTAMP = "2020-01-15 10:00:00"
+DAYS = 7
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", tmp_path / "archive")
+    return archive.ARCHIVE_DIR
+
+
+def user_on_shard(shard: int, prefix: str) -> str:
+    return next(
+        name for name in (f"{prefix}{i}" for i in range(1000))
+        if models.shard_for_user(name) == shard
+    )
+
+
+def create_old_plan(user_name: str) -> int:
+    """A completed weekly plan created in January 2020."""
+    preference_id = models.save_preferences(user_name, 2000, "", "", "", "weekly", {}, 2000)
+    models.save_menu_days(preference_id, [
+        {
+            "day": day,
+            "menu": {"breakfast": {"name": f"{user_name} {day}", "calories": 500}},
+            "total_calories": 500,
+            "total_proteins": 20,
+            "total_fats": 10,
+            "total_carbs": 60,
+        }
+        for day in range(1, DAYS + 1)
+    ])
+    conn = models.get_connection(models.shard_for_record("preferences", preference_id))
+    conn.execute("UPDATE preferences SET created_at = ? WHERE id = ?", (OLD_TIMESTAMP, preference_id))
+    conn.execute(
+        "UPDATE menu_history SET created_at = ? WHERE preference_id = ?",
+        (OLD_TIMESTAMP, preference_id),
+    )
+    conn.commit()
+    conn.close()
+    return preference_id
+
+
+def archived_days(archive_dir) -> int:
+    conn = sqlite3.connect(archive_dir / "foodfit-2020-01.db")
+    count = conn.execute("SELECT COUNT(*) FROM menu_history").fetchone()[0]
+    conn.close()
+    return count
+
+
+def test_days_of_all_shards_share_the_monthly_archive(archive_dir):
+    assert models.SHARD_COUNT == 3
+    plans = {
+        create_old_plan(user_on_shard(shard, "shared")): shard for shard in models.shard_ids()
+    }
+
+    moved = archive.run_archival(max_age_days=90)
+
+    assert moved["preferences"] == 3
+    assert moved["menu_history"] == 3 * DAYS
+    assert archived_days(archive_dir) == 3 * DAYS
+    for preference_id in plans:
+        assert models.get_plan_days(preference_id) == []
+        user_name = archive.find_preference(preference_id)["user_name"]
+        days = archive.find_plan_days(preference_id)
+        assert [day["day_number"] for day in days] == list(range(1, DAYS + 1))
+        assert all(day["menu"]["breakfast"]["name"].startswith(user_name) for day in days)
+
+
+def test_archives_keyed_by_day_id_are_upgraded(archive_dir):
+    archive_dir.mkdir()
+    # Layout written before menu_history was keyed by plan and day
+    conn = sqlite3.connect(archive_dir / "foodfit-2020-01.db")
+    conn.execute("""
+        CREATE TABLE menu_history (
+            id, preference_id, day_number, menu_json, total_calories,
+            total_proteins, total_fats, total_carbs, created_at
+        )
+    """)
+    conn.execute("CREATE UNIQUE INDEX idx_menu_history_id ON menu_history (id)")
+    conn.commit()
+    conn.close()
+    before = archived_days(archive_dir)
+
+    for shard in models.shard_ids():
+        create_old_plan(user_on_shard(shard, "legacy"))
+    archive.run_archival(max_age_days=90)
+
+    assert archived_days(archive_dir) == before + 3 * DAYS
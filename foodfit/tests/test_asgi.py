@@ -0,0 +1,77 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import app
+import asgi
+
+
+def post(path: str, body: dict, headers: tuple = ()) -> tuple:
+    """Send one request through the ASGI app; returns (status, headers, body)."""
+    raw = json.dumps(body).encode("utf-8")
+    sent = []
+
+    async def receive() -> dict:
+        return {"type": "http.request", "body": raw, "more_body": False}
+
+    async def send(message: dict) -> None:
+        sent.append(message)
+
+    scope = {
+        "type": "http", "method": "POST", "path": path, "query_string": b"",
+        "headers": [(b"content-type", b"application/json"), *headers],
+    }
+    asyncio.run(asgi.app(scope, receive, send))
+    return sent[0]["status"], dict(sent[0]["headers"]), b"".join(m.get("body", b"") for m in sent[1:])
+
+
+@pytest.fixture
+def executors(monkeypatch):
+    """DB threads that record their use, and a thread pool instead of processes."""
+    db_calls = []
+
+    class RecordingPool(ThreadPoolExecutor):
+        def submit(self, fn, *args, **kwargs):
+            db_calls.append(fn.__name__)
+            return super().submit(fn, *args, **kwargs)
+
+    generation = ThreadPoolExecutor(1)
+    monkeypatch.setattr(asgi, "_executors", {"db": RecordingPool(2), "generation": generation})
+    yield db_calls
+    asgi._shutdown_executors()
+
+
+def test_preferences_match_flask_and_use_the_db_threads(executors):
+    body = {"calories": 2100, "plan_type": "weekly", "likes": "курка"}
+    status, _, raw = post("/api/preferences", dict(body, user_name="asgi"))
+    expected = app.app.test_client().post("/api/preferences", json=dict(body, user_name="flask"))
+
+    assert status == 201
+    assert executors == ["read_plan_request", "save_plan_job"]
+    served, flask_served = json.loads(raw), expected.get_json()
+    for response in (served, flask_served):
+        del response["user_name"], response["record_id"]
+    assert served == flask_served
+
+
+def test_generation_runs_in_the_generation_pool(executors, monkeypatch):
+    generated = []
+    original = app.serialized_plan_days
+
+    def serialized_plan_days(*args):
+        generated.append(args[4:6])
+        return original(*args)
+
+    monkeypatch.setattr(app, "serialized_plan_days", serialized_plan_days)
+    status, _, _ = post("/api/preferences", {"user_name": "asgi-pool", "calories": 1900})
+
+    assert status == 201
+    assert generated == [(1, 7)]
+
+
+def test_missing_user_name_is_rejected(executors):
+    status, _, raw = post("/api/preferences", {"calories": 1900})
+    assert status == 400
+    assert json.loads(raw) == {"error": app.USER_NAME_REQUIRED_ERROR}
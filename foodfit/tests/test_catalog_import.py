@@ -0,0 +1,32 @@
+import pytest
+
+import catalog_import
+
+VALID = {
+    "name": "Сирники",
+    "meal_type": "breakfast",
+    "calories": "400",
+    "proteins": "20",
+    "fats": "15",
+    "carbs": "45",
+    "ingredients": "сир;борошно",
+}
+
+
+@pytest.mark.parametrize("value", ["nan", "inf", "-inf", "1e400"])
+def test_non_finite_numbers_are_invalid_rows(value):
+    with pytest.raises(catalog_import.InvalidRow):
+        catalog_import.meal_row(dict(VALID, fats=value))
+
+
+def test_bad_cells_do_not_abort_the_import(tmp_path):
+    source = tmp_path / "meals.csv"
+    source.write_text(
+        "name,meal_type,calories,proteins,fats,carbs\n"
+        "Сирники,breakfast,nan,20,15,45\n"
+        "Омлет,breakfast,1e400,20,15,45\n"
+        "Каша,breakfast,400,20,15,45\n",
+        encoding="utf-8",
+    )
+    counts = catalog_import.import_file("meals", source, dry_run=True)
+    assert counts == {"read": 3, "imported": 1, "invalid": 2, "duplicates": 0}
@@ -0,0 +1,61 @@
+import app
+import idempotency
+import models
+
+
+def stored_keys(shard: int) -> set:
+    conn = models.get_connection(shard)
+    keys = {row["key"] for row in conn.execute("SELECT key FROM idempotency_keys")}
+    conn.close()
+    return keys
+
+
+def test_keys_are_stored_on_the_shard_of_their_hash():
+    keys = [f"shard-key-{i}" for i in range(30)]
+    for key in keys:
+        idempotency.run("test", key, "body", lambda: (201, "application/json", b"{}"))
+
+    for key in keys:
+        shard = models.stable_hash(key) % models.SHARD_COUNT
+        assert key in stored_keys(shard)
+        assert all(key not in stored_keys(other) for other in models.shard_ids() if other != shard)
+    assert len({idempotency._shard(key) for key in keys}) == models.SHARD_COUNT
+
+
+ORDER = {
+    "user_name": "Ідемпотентність", "phone": "+380671112233", "address": "Київ",
+    "items": [{"name": "Омлет", "calories": 320}], "total_calories": 320,
+}
+
+
+def count_orders(user_name: str) -> int:
+    return sum(
+        row[0] for row in models.fan_out("SELECT COUNT(*) FROM orders WHERE user_name = ?", (user_name,))
+    )
+
+
+def test_retry_replays_the_stored_response():
+    client = app.app.test_client()
+    headers = {"Idempotency-Key": "order-replay"}
+
+    first = client.post("/api/order", json=ORDER, headers=headers)
+    retry = client.post("/api/order", json=ORDER, headers=headers)
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.get_data() == first.get_data()
+    assert "Idempotent-Replayed" not in first.headers
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert count_orders(ORDER["user_name"]) == 1
+
+
+def test_key_reused_with_another_body_is_rejected():
+    client = app.app.test_client()
+    headers = {"Idempotency-Key": "order-reuse"}
+
+    order = dict(ORDER, user_name="Інше тіло")
+    assert client.post("/api/order", json=order, headers=headers).status_code == 201
+    other = client.post("/api/order", json=dict(order, address="Львів"), headers=headers)
+
+    assert other.status_code == 422
+    assert other.get_json() == {"error": idempotency.KEY_REUSED_ERROR}
+    assert count_orders(order["user_name"]) == 1
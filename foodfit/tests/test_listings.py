@@ -0,0 +1,62 @@
+import pytest
+
+import app
+import models
+
+TOKEN = {"X-Admin-Token": "listings"}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app, "ADMIN_TOKEN", TOKEN["X-Admin-Token"])
+    return app.app.test_client()
+
+
+def user_on_shard(shard: int) -> str:
+    return next(
+        name for name in (f"listing{i}" for i in range(1000))
+        if models.shard_for_user(name) == shard
+    )
+
+
+def create_orders() -> list:
+    """Three orders per shard in May 2019, two of them at the same second."""
+    created = []
+    for shard in models.shard_ids():
+        user_name = user_on_shard(shard)
+        for minute in (shard, shard, 10 + shard):
+            order_id = models.save_order(None, user_name, "+380671112233", "Київ", "", [], 0)
+            created_at = f"2019-05-0{minute % 3 + 1} 12:{minute:02d}:00"
+            conn = models.get_connection(shard)
+            conn.execute("UPDATE orders SET created_at = ? WHERE id = ?", (created_at, order_id))
+            conn.commit()
+            conn.close()
+            created.append((created_at, order_id))
+    return sorted(created, reverse=True)
+
+
+def test_cursor_pages_through_all_shards(client):
+    expected = create_orders()
+
+    seen, cursor = [], ""
+    while True:
+        response = client.get(
+            f"/api/orders?from=2019-05-01&to=2019-05-31&limit=2&cursor={cursor}", headers=TOKEN
+        )
+        assert response.status_code == 200
+        page = response.get_json()
+        assert len(page["orders"]) <= 2
+        seen += [(order["created_at"], order["id"]) for order in page["orders"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == expected
+    assert {models.shard_for_record("orders", order_id) for _, order_id in seen} == set(models.shard_ids())
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "WzEsMl0=", "bnVsbA=="])
+def test_bad_cursor_is_rejected(client, cursor):
+    response = client.get(f"/api/orders?cursor={cursor}", headers=TOKEN)
+    assert response.status_code == 400
+    assert "error" in response.get_json()
@@ -0,0 +1,57 @@
+import pytest
+
+import catalog
+import nutrition
+
+MENU = {
+    meal_type: catalog.build_library(catalog.DEFAULT_MEALS)[meal_type][0]
+    for meal_type in catalog.MEAL_TYPES
+}
+SNACKS = [
+    {"id": 1, "name": "Грецький йогурт", "calories": 150, "proteins": 10, "fats": 5, "carbs": 16},
+    {"id": 2, "name": "Протеїновий батончик", "calories": 250, "proteins": 20, "fats": 8, "carbs": 25},
+    {"id": 3, "name": "Без БЖВ", "calories": 300, "proteins": 0, "fats": 0, "carbs": 0},
+]
+
+
+def solve(**kwargs):
+    targets = nutrition.calculate_target_macros(2600)
+    return nutrition.solve_day(MENU, SNACKS, 2600, targets, **kwargs)
+
+
+def test_solution_does_not_depend_on_timing():
+    first = solve()
+    assert all(solve() == first for _ in range(20))
+    # The default budget covers the full search
+    assert first == solve(max_expansions=10 ** 9)
+
+
+def test_snacks_without_macros_are_skipped():
+    chosen = solve()["snacks"]
+    assert chosen
+    assert all(snack["name"] != "Без БЖВ" for snack in chosen)
+
+
+def test_exhausted_budget_keeps_standard_portions():
+    solution = solve(max_expansions=0)
+    assert solution["portions"] == {meal_type: 1.0 for meal_type in MENU}
+    assert solution["snacks"] == []
+
+
+def test_non_finite_macro_ratios_are_invalid():
+    for value in ("inf", "-inf", "nan", float("inf")):
+        assert nutrition.parse_macro_ratios({"proteins": value, "fats": 30, "carbs": 40}) is None
+    assert nutrition.parse_macro_ratios({"proteins": 30, "fats": 30, "carbs": 40}) == pytest.approx(
+        {"proteins": 0.3, "fats": 0.3, "carbs": 0.4}
+    )
+
+
+def test_preferences_with_non_finite_ratios_use_the_defaults():
+    import app
+
+    response = app.app.test_client().post("/api/preferences", json={
+        "user_name": "nan-ratios", "calories": 2000,
+        "macro_ratios": {"proteins": "nan", "fats": 30, "carbs": "inf"},
+    })
+    assert response.status_code == 201
+    assert app.models.get_preference(response.get_json()["record_id"])["macro_ratios"] is None
@@ -0,0 +1,50 @@
+import pytest
+
+import app
+import models
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+def post_plan(client, **body):
+    response = client.post("/api/preferences", json={"calories": 2000, "plan_type": "weekly", **body})
+    assert response.status_code == 201
+    return response.get_json()
+
+
+def test_same_profile_returns_the_stored_days(client, monkeypatch):
+    first = post_plan(client, user_name="Повторний", likes="курка")
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the stored plan is complete, nothing to generate")
+
+    monkeypatch.setattr(app, "generate_plan_days", fail)
+    again = post_plan(client, user_name="Повторний", likes="курка")
+
+    assert again["record_id"] == first["record_id"]
+    assert again["days"] == first["days"]
+    assert len(models.get_plan_days(first["record_id"])) == 7
+
+
+def test_extend_appends_days_after_the_last_stored_day(client):
+    first = post_plan(client, user_name="Продовження")
+    extended = post_plan(client, user_name="Продовження", mode="extend")
+
+    assert extended["record_id"] == first["record_id"]
+    assert [day["day"] for day in extended["days"]] == list(range(8, 15))
+    stored = models.get_plan_days(first["record_id"])
+    assert [day["day_number"] for day in stored] == list(range(1, 15))
+    # The first week is kept as it was
+    assert [day["menu"] for day in stored[:7]] == [day["menu"] for day in first["days"]]
+
+
+def test_changed_profile_starts_a_new_plan_and_keeps_the_old_one(client):
+    first = post_plan(client, user_name="Новий профіль")
+    changed = post_plan(client, user_name="Новий профіль", calories=1500)
+
+    assert changed["record_id"] != first["record_id"]
+    assert [day["day"] for day in changed["days"]] == list(range(1, 8))
+    assert len(models.get_plan_days(first["record_id"])) == 7
@@ -0,0 +1,34 @@
+import sqlite3
+
+import profiler
+
+
+class RecordingConnection(sqlite3.Connection):
+    """Connection that remembers which trace callbacks were set."""
+
+    def set_trace_callback(self, callback):
+        self.callbacks = getattr(self, "callbacks", []) + [callback]
+        super().set_trace_callback(callback)
+
+
+def test_explain_of_a_slow_query_is_not_counted(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiler, "SLOW_QUERY_MS", 0)
+    monkeypatch.setattr(profiler, "SLOW_QUERY_LOG", tmp_path / "slow.log")
+    monkeypatch.setattr(profiler, "statement_stats", {})
+    conn = sqlite3.connect(":memory:", factory=RecordingConnection)
+    conn.set_trace_callback(profiler.trace)
+    conn.execute("CREATE TABLE meals (id INTEGER PRIMARY KEY, name TEXT)")
+
+    token = profiler.start_request("test")
+    conn.cursor(profiler.TracedCursor).execute("SELECT name FROM meals WHERE id = ?", (1,))
+    profile = profiler.finish_request(token)
+
+    assert list(profile.statements) == ["SELECT name FROM meals WHERE id = ?"]
+    assert list(profiler.statement_stats) == ["SELECT name FROM meals WHERE id = ?"]
+    assert profiler.slow_queries[-1]["plan"]
+    # Tracing is off while the EXPLAIN runs, whether or not SQLite traces it
+    assert conn.callbacks == [profiler.trace, None, profiler.trace]
+    # Tracing is back on after the EXPLAIN
+    token = profiler.start_request("test")
+    conn.execute("SELECT 1")
+    assert profiler.finish_request(token).query_count == 1
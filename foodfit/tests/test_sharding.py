@@ -0,0 +1,82 @@
+import pytest
+
+import models
+import reshard
+
+USERS = [f"Користувач {i}" for i in range(12)]
+DAYS = 3
+
+
+def rows_by_shard(table: str, shards: range) -> dict:
+    """Shard of every row of a table, keyed by the row's user or plan."""
+    key = "preference_id, day_number" if table == "menu_history" else "id, user_name"
+    found = {}
+    for shard in shards:
+        conn = models.get_connection(shard)
+        for row in conn.execute(f"SELECT {key} FROM {table}"):
+            found[tuple(row)] = shard
+        conn.close()
+    return found
+
+
+def create_user_data(user_name: str) -> int:
+    preference_id = models.save_preferences(user_name, 2000, "", "", "", "weekly", {}, 2000)
+    models.save_menu_days(preference_id, [
+        {"day": day, "menu": {}, "total_calories": 0, "total_proteins": 0, "total_fats": 0, "total_carbs": 0}
+        for day in range(1, DAYS + 1)
+    ])
+    models.save_order(preference_id, user_name, "+380671112233", "Київ", "", [{"name": "Омлет"}], 320)
+    return preference_id
+
+
+@pytest.fixture
+def fresh_shards(tmp_path, monkeypatch):
+    """Empty shard files of their own, so resharding does not touch other tests."""
+    models.close_pools()
+    monkeypatch.setattr(models, "DB_PATH", tmp_path / "database.db")
+    monkeypatch.setattr(models, "_pools", {})
+    models.shard_for_record.cache_clear()
+    models.init_database()
+    yield
+    models.close_pools()
+    models.shard_for_record.cache_clear()
+
+
+def test_rows_go_to_the_shard_of_the_user_hash(fresh_shards):
+    plans = {user_name: create_user_data(user_name) for user_name in USERS}
+
+    assert {models.shard_for_user(name) for name in USERS} == set(models.shard_ids())
+    preferences = rows_by_shard("preferences", models.shard_ids())
+    orders = rows_by_shard("orders", models.shard_ids())
+    for user_name, preference_id in plans.items():
+        shard = models.stable_hash(user_name) % models.SHARD_COUNT
+        assert preferences[(preference_id, user_name)] == shard
+        # IDs point back to their shard
+        assert preference_id % models.SHARD_COUNT == shard
+        assert models.shard_for_record("preferences", preference_id) == shard
+        assert [s for (_, name), s in orders.items() if name == user_name] == [shard]
+
+
+def test_reshard_moves_rows_to_the_new_shard_and_keeps_ids(fresh_shards, monkeypatch):
+    plans = {user_name: create_user_data(user_name) for user_name in USERS}
+    before = {table: rows_by_shard(table, models.shard_ids()) for table in reshard.USER_TABLES}
+
+    totals = reshard.reshard(3, 4)
+
+    monkeypatch.setattr(models, "SHARD_COUNT", 4)
+    models.shard_for_record.cache_clear()
+    after = {table: rows_by_shard(table, models.shard_ids()) for table in reshard.USER_TABLES}
+    moved_users = {name for name in USERS if models.stable_hash(name) % 3 != models.stable_hash(name) % 4}
+    assert moved_users
+    assert totals["users"] == len(moved_users)
+    assert totals["menu_history"] == DAYS * len(moved_users)
+
+    for table in reshard.USER_TABLES:
+        # Every row is kept exactly once, with its ID
+        assert set(after[table]) == set(before[table])
+    for user_name, preference_id in plans.items():
+        shard = models.stable_hash(user_name) % 4
+        assert after["preferences"][(preference_id, user_name)] == shard
+        assert models.shard_for_record("preferences", preference_id) == shard
+        assert [day["day_number"] for day in models.get_plan_days(preference_id)] == list(range(1, DAYS + 1))
+        assert {s for (_, name), s in after["orders"].items() if name == user_name} == {shard}
@@ -0,0 +1,32 @@
+from array import array
+
+import shared_catalog
+
+
+def test_id_cache_is_bounded_by_the_ids_it_holds():
+    cache = shared_catalog.IdCache(max_ids=10)
+    calls = []
+
+    @cache
+    def select(count: int) -> array:
+        calls.append(count)
+        return array("I", range(count))
+
+    first = select(4)
+    assert select(4) is first
+    select(5)
+    assert cache.size == 9
+    # Adding 3 more ids evicts the least recently used selection
+    select(3)
+    assert cache.size == 8
+    select(4)
+    assert calls == [4, 5, 3, 4]
+
+    # A selection larger than the budget is not cached
+    select(11)
+    select(11)
+    assert calls[-2:] == [11, 11]
+    assert cache.size <= 10
+
+    cache.clear()
+    assert cache.size == 0
@@ -0,0 +1,56 @@
+import re
+
+import pytest
+
+import app
+import static_assets
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+def hashed_url(client, page: str, name: str) -> str:
+    """URL of the hashed asset a page references for `name` (e.g. style.css)."""
+    stem, suffix = name.rsplit(".", 1)
+    html = client.get(f"/{page}").get_data(as_text=True)
+    match = re.search(rf'"({re.escape(stem)}\.[0-9a-f]{{10}}\.{suffix})"', html)
+    assert match, f"{page} does not reference a hashed {name}"
+    return f"/{match.group(1)}"
+
+
+def test_hashed_asset_is_immutable_and_revalidates_with_304(client):
+    url = hashed_url(client, "index.html", "style.css")
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == static_assets.IMMUTABLE
+    etag = response.headers["ETag"]
+
+    cached = client.get(url, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.get_data() == b""
+
+    compressed = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert compressed.headers["ETag"] != etag
+    assert client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": etag}).status_code == 200
+
+
+def test_range_request_gets_partial_identity_content(client):
+    url = hashed_url(client, "index.html", "style.css")
+    full = client.get(url).get_data()
+
+    response = client.get(url, headers={"Range": "bytes=10-29", "Accept-Encoding": "gzip"})
+
+    assert response.status_code == 206
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["Content-Range"] == f"bytes 10-29/{len(full)}"
+    assert response.get_data() == full[10:30]
+
+
+def test_pages_are_revalidated(client):
+    response = client.get("/index.html")
+    assert response.headers["Cache-Control"] == static_assets.REVALIDATE
+    assert client.get("/index.html", headers={"If-None-Match": response.headers["ETag"]}).status_code == 304